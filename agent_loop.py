@@ -1,12 +1,25 @@
+import asyncio
 import json
-from typing import Literal, Optional
+import logging
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Literal, Optional
 
-import requests
 from pydantic import ValidationError
 import os
+import http_clients
 from agent_schemas import AgentResponse, FactExtraction
-from memory import MemoryDB
-from tools import execute_tool
+from compaction import compact_tool_results
+from fact_worker import FactExtractionWorker
+from memory import DEFAULT_SESSION, AsyncMemoryDB, MemoryDB, TurnWriter
+from renderers import try_render
+from token_budget import truncate_to_tokens
+from response_cache import aexecute_tools_cached, execute_tools_cached, get_plan, store_plan
+from tools import HomeWeatherRefresher, aexecute_tools, execute_tools
+from vector_index import VectorIndex
+
+logger = logging.getLogger(__name__)
 
 SYSTEM_PROMPT = """
 You are THURSDAY (Tool-Handling, User-Respecting, Self-Hosted Digital Assistant (Yours)) a local-first assistant.
@@ -23,9 +36,9 @@ Allowed Tools:
 
 1) get_time
   - Use when users ask you to get the current time/date.
-  - args can be {} OR {"timezone": "<IANA timezone like America/New_York>"}.
-  - If the user asks for a specific place/timezone, you MUST include the "timezone" field.
-  - If user gives a city/state, you MUST convert it to an IANA timezone. Example: Plantation, FL → America/New_York.
+  - args can be {} OR {"timezone": "<IANA timezone like America/New_York>"} OR {"location": "<City, ST or City, Country>"}.
+  - If the user asks for a specific timezone, you MUST include the "timezone" field.
+  - If the user gives a city/state, pass it as "location" exactly as a plain string (the tool resolves its timezone). Example: Plantation, FL → {"location": "Plantation, FL"}.
 2) echo
   - Use when a user ask you to repeat something.
   - args must be {"text": "<string to echo>"}
@@ -53,12 +66,14 @@ Allowed Tools:
     - Use when the user ask for up-to-date information or on knowledge that you are not highly confident on.
     - Args (MUST use these exact keys):
         - query: The query provided by the user at the time of prompting
+        - deep: OPTIONAL boolean. Set true when short snippets will not be enough (how/why questions, details of a recent event, step-by-step instructions); the tool then also reads the top pages and returns "excerpts". Omit it for quick facts.
 
     - Use this tool if a user ask about information such as the "current", "latest", "today", "breaking", "updates", "news".
     - Use this tool if a user ask about current office-holders (such as presidents, politicians, CEOs, general C-Suite), software versions, prices, outages, schedules; any information that is fluent and likely to change.
     - DO NOT USE THIS TOOL FOR TIMELESS INFORMATION (math, general explanations, personal advice) unless the user specifically ask you for sources.
     - Returns
         - results: 5 of the most relevant results that you will read and interpret.
+        - excerpts (deep only): passages from the top pages that match the query; prefer them over snippets.
     - When you use the web_search tool, you will return "I just used the web search tool" and insert your response after.
 Examples:
 User: What's the weather in Miami, FL right now?
@@ -84,7 +99,7 @@ Assistant:
 {"reply":"Checking the time in America/Chicago.","tts_text":"Checking the time in America/Chicago.","tool_calls":[{"name":"get_time","args":{"timezone":"America/Chicago"}}]}
 User: What time is it in Miami, FL?
 Assistant:
-{"reply":"Checking the time in America/New_York.","tts_text":"Checking the time in America/New_York.","tool_calls":[{"name":"get_time","args":{"timezone":"America/New_York"}}]}
+{"reply":"Checking the time in Miami, FL.","tts_text":"Checking the time in Miami.","tool_calls":[{"name":"get_time","args":{"location":"Miami, FL"}}]}
 User: Why is the sky blue?
 Assistant:
 {"reply":"Because air molecules scatter shorter (blue) wavelengths of sunlight more strongly than longer wavelengths (Rayleigh scattering).","tts_text":"Because air molecules scatter blue light more strongly than other colors. That’s called Rayleigh scattering.","tool_calls":[]}
@@ -93,17 +108,90 @@ Assistant:
 FACT_EXTRACTOR_SYSTEM = """
 You are a fact extractor for a local assistant.
 Return ONLY valid JSON matching this shape:
-{"facts":[{"key":string,"value":any,"confidence":number,"source":"explicit_user"|"assistant_inference"|"tool_result"}]}
+{"facts":[{"key":string,"value":any,"confidence":number,"source":"explicit_user"|"assistant_inference"|"tool_result","turn":integer}]}
+
+The input is one conversation turn, or several turns as numbered blocks ("TURN 1", "TURN 2", ...)
+in the order they happened, oldest first.
 
 Rules:
 - Extract ONLY stable, long-lived facts (name, preferences, timezone, ongoing constraints/goals).
-- Max 5 facts.
+- Max 5 facts per turn.
+- "turn": the number of the TURN block the fact comes from (1 when there are no TURN blocks).
+- If several turns give the same key, the latest TURN wins: output that key once, with the latest value and turn.
 - DO NOT store secrets (passwords, tokens, API keys), financial numbers, or anything sensitive.
 - If nothing worth saving: {"facts":[]}
 """.strip()
 
+HISTORY_SUMMARIZER_SYSTEM = """
+You maintain a running summary of a household assistant's past conversations.
+You get the PREVIOUS_SUMMARY (may be empty) and the next chunk of CONVERSATION.
+Return ONLY the updated summary as plain text (no JSON, no markdown headings):
+- At most 200 words.
+- Keep what could matter later: topics discussed, requests made, decisions, open questions, places and dates.
+- Drop greetings, small talk, and exact tool output (weather readings, times, search results).
+- Do not repeat facts verbatim if they are still covered; merge them.
+""".strip()
+
 URL = os.getenv("OLLAMA_URL", "http://ollama:11434/api/generate")
+# All calls go through /api/chat so consecutive calls share a message-list prefix (KV cache reuse).
+CHAT_URL = os.getenv("OLLAMA_CHAT_URL") or URL.replace("/api/generate", "/api/chat")
 MODEL = os.getenv("OLLAMA_MODEL", "qwen3.5:9b")
+# Keep the model (and its KV cache) resident between turns.
+KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+HISTORY_LIMIT = int(os.getenv("THURSDAY_HISTORY_LIMIT", "20"))
+# The history window start only moves every HISTORY_STRIDE messages, so the prompt prefix stays stable.
+HISTORY_STRIDE = int(os.getenv("THURSDAY_HISTORY_STRIDE", "10"))
+# Older messages most relevant to the new prompt (full-text search) injected alongside the recent
+# window; 0 disables. THURSDAY_HISTORY_LIMIT=0 with a recall K uses recall instead of recency.
+HISTORY_RECALL_K = int(os.getenv("THURSDAY_HISTORY_RECALL_K", "4"))
+# Estimated-token budget for MEMORY_CONTEXT + history (see token_budget.pack_context); 0 disables.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("THURSDAY_CONTEXT_TOKEN_BUDGET", "3000"))
+# Include the rolling summary of archived history (see retention.py) in MEMORY_CONTEXT.
+HISTORY_SUMMARY = os.getenv("THURSDAY_HISTORY_SUMMARY", "1") == "1"
+# Keep the home forecast warm in the background (tools.HomeWeatherRefresher). The location is
+# WEATHER_HOME_LOCATION or, failing that, the first of HOME_LOCATION_FACT_KEYS saved as a fact.
+HOME_WEATHER_REFRESH = os.getenv("WEATHER_HOME_REFRESH", "0") == "1"
+HOME_LOCATION = os.getenv("WEATHER_HOME_LOCATION", "").strip()
+HOME_LOCATION_FACT_KEYS = ("home_location", "location", "home_city", "city")
+# Semantic memory: embed facts/messages with EMBED_MODEL and, once there are more than
+# FACTS_TOP_K facts, send only the FACTS_TOP_K most relevant to the prompt. Below that the
+# full (stable, cacheable) fact map is sent. Message vectors add to the full-text recall.
+SEMANTIC_MEMORY = os.getenv("THURSDAY_SEMANTIC_MEMORY", "0") == "1"
+EMBED_URL = os.getenv("OLLAMA_EMBED_URL") or URL.replace("/api/generate", "/api/embed")
+EMBED_MODEL = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+FACTS_TOP_K = int(os.getenv("THURSDAY_FACTS_TOP_K", "12"))
+
+# Structured outputs: Ollama constrains decoding to these JSON schemas, so the model cannot
+# emit malformed or off-shape JSON. The repair loop in validate_response is only a fallback.
+AGENT_RESPONSE_FORMAT = AgentResponse.model_json_schema()
+FACT_EXTRACTION_FORMAT = FactExtraction.model_json_schema()
+
+# Repair-loop bookkeeping per pass, to see how often the fallback still fires and what it costs.
+VALIDATION_STATS: Dict[str, Dict[str, float]] = {
+    mode: {"calls": 0, "repaired_calls": 0, "repair_attempts": 0, "failures": 0, "repair_ms": 0.0}
+    for mode in ("first", "final")
+}
+_stats_lock = threading.Lock()
+
+# Prompt-eval accounting from Ollama's response metadata. prompt_eval_count only counts tokens
+# that were actually evaluated, so a low count relative to the prompt size means a KV-cache hit.
+OLLAMA_STATS: Dict[str, float] = {
+    "calls": 0,
+    "prompt_eval_count": 0,
+    "prompt_eval_ms": 0.0,
+    "eval_count": 0,
+    "eval_ms": 0.0,
+    "prompt_tokens_est": 0,
+}
+# Memory-context packing per turn: how much of CONTEXT_TOKEN_BUDGET was used and what was cut.
+CONTEXT_STATS: Dict[str, float] = {
+    "turns": 0,
+    "used_tokens": 0,
+    "max_used_tokens": 0,
+    "facts_dropped": 0,
+    "messages_dropped": 0,
+    "messages_truncated": 0,
+}
 
 def should_extract_facts(text: str) -> bool:
     t = text.lower()
@@ -123,34 +211,196 @@ def should_extract_facts(text: str) -> bool:
     return any(x in t for x in triggers)
 
 
+_db: Optional[MemoryDB] = None
+
+
 def initalize_db() -> MemoryDB:
-    # Creating the DB object creates tables + enables WAL.
-    # Your methods open/close connections per call, so this isn't a global connection.
-    return MemoryDB()
+    # One process-wide MemoryDB: schema is created once and each thread keeps its own
+    # persistent connection, instead of reconnecting for every call.
+    global _db
+    if _db is None:
+        _db = MemoryDB()
+    return _db
 
 
-def _post_ollama(payload: dict) -> str:
-    """Call Ollama and return the raw JSON string in resp['response']."""
-    resp = requests.post(URL, json=payload, timeout=60)
-    resp.raise_for_status()
-    return resp.json()["response"]
+def _agent_payload(messages: List[dict]) -> dict:
+    return {
+        "model": MODEL,
+        "messages": messages,
+        "stream": False,
+        "format": AGENT_RESPONSE_FORMAT,
+        "keep_alive": KEEP_ALIVE,
+    }
 
 
-# Validate model output, with up to 3 repair attempts
-def validate_response(payload: dict, mode: Literal["first", "final"]) -> AgentResponse:
-    retries = 0
-    raw = "<bad_output>"
+def _record_ollama_metrics(payload: dict, body: dict) -> None:
+    prompt_eval = int(body.get("prompt_eval_count") or 0)
+    prompt_eval_ms = (body.get("prompt_eval_duration") or 0) / 1e6
+    eval_count = int(body.get("eval_count") or 0)
+    eval_ms = (body.get("eval_duration") or 0) / 1e6
+    # Rough size of the whole prompt (~4 chars/token) to put prompt_eval_count in context.
+    prompt_tokens_est = sum(len(m.get("content") or "") for m in payload.get("messages", [])) // 4
+    with _stats_lock:
+        OLLAMA_STATS["calls"] += 1
+        OLLAMA_STATS["prompt_eval_count"] += prompt_eval
+        OLLAMA_STATS["prompt_eval_ms"] += prompt_eval_ms
+        OLLAMA_STATS["eval_count"] += eval_count
+        OLLAMA_STATS["eval_ms"] += eval_ms
+        OLLAMA_STATS["prompt_tokens_est"] += prompt_tokens_est
+    logger.debug(
+        "ollama: prompt_eval_count=%d (~%d prompt tokens) prompt_eval_ms=%.0f eval_count=%d eval_ms=%.0f",
+        prompt_eval, prompt_tokens_est, prompt_eval_ms, eval_count, eval_ms,
+    )
 
-    while retries < 3:
-        try:
-            raw = _post_ollama(payload)
-            parsed_json = json.loads(raw)
-            return AgentResponse.model_validate(parsed_json)
-        except (json.JSONDecodeError, ValidationError) as e:
-            print("Error in Validation!", e)
 
-            if mode == "final":
-                repair_prompt = f"""
+def ollama_stats() -> Dict[str, float]:
+    with _stats_lock:
+        out = dict(OLLAMA_STATS)
+    est = out["prompt_tokens_est"]
+    out["prompt_cache_hit_rate_est"] = round(max(0.0, 1 - out["prompt_eval_count"] / est), 4) if est else 0.0
+    out["prompt_eval_ms"] = round(out["prompt_eval_ms"], 1)
+    out["eval_ms"] = round(out["eval_ms"], 1)
+    return out
+
+
+def _record_context_budget(report: Dict[str, Any]) -> None:
+    with _stats_lock:
+        CONTEXT_STATS["turns"] += 1
+        CONTEXT_STATS["used_tokens"] += report["used"]
+        CONTEXT_STATS["max_used_tokens"] = max(CONTEXT_STATS["max_used_tokens"], report["used"])
+        CONTEXT_STATS["facts_dropped"] += report["facts"]["dropped"]
+        for part in ("recent_messages", "relevant_messages"):
+            CONTEXT_STATS["messages_dropped"] += report[part]["dropped"]
+            CONTEXT_STATS["messages_truncated"] += report[part]["truncated"]
+    logger.debug(
+        "memory context: ~%d/%d tokens, facts %d (+%d dropped), history %d (+%d dropped)",
+        report["used"], report["budget"], report["facts"]["included"], report["facts"]["dropped"],
+        report["recent_messages"]["included"], report["recent_messages"]["dropped"],
+    )
+
+
+def context_stats() -> Dict[str, float]:
+    with _stats_lock:
+        out = dict(CONTEXT_STATS)
+    out["budget"] = CONTEXT_TOKEN_BUDGET
+    out["avg_used_tokens"] = round(out["used_tokens"] / out["turns"], 1) if out["turns"] else 0.0
+    return out
+
+
+def _record_validation(mode: str, attempts: int, repair_seconds: float, failed: bool = False) -> None:
+    with _stats_lock:
+        stats = VALIDATION_STATS[mode]
+        stats["calls"] += 1
+        stats["repair_attempts"] += attempts
+        stats["repair_ms"] += repair_seconds * 1000
+        if attempts:
+            stats["repaired_calls"] += 1
+        if failed:
+            stats["failures"] += 1
+    if attempts:
+        print(f"JSON repair fallback used ({mode}): {attempts} extra call(s), {repair_seconds * 1000:.0f} ms")
+
+
+def validation_stats() -> Dict[str, Dict[str, float]]:
+    with _stats_lock:
+        out = {mode: dict(stats) for mode, stats in VALIDATION_STATS.items()}
+    for stats in out.values():
+        stats["repair_rate"] = round(stats["repaired_calls"] / stats["calls"], 4) if stats["calls"] else 0.0
+        stats["repair_ms"] = round(stats["repair_ms"], 1)
+    return out
+
+
+def _post_ollama(payload: dict) -> str:
+    """Call Ollama's /api/chat and return the raw JSON string in resp['message']['content']."""
+    resp = http_clients.post("ollama", CHAT_URL, json=payload)
+    resp.raise_for_status()
+    body = resp.json()
+    _record_ollama_metrics(payload, body)
+    return body["message"]["content"]
+
+
+def _stream_ollama(payload: dict) -> Iterator[str]:
+    """Call Ollama with streaming enabled and yield raw response chunks as they are generated."""
+    with http_clients.post("ollama", CHAT_URL, json={**payload, "stream": True}, stream=True) as resp:
+        resp.raise_for_status()
+        for line in resp.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            content = (chunk.get("message") or {}).get("content")
+            if content:
+                yield content
+            if chunk.get("done"):
+                _record_ollama_metrics(payload, chunk)
+                break
+
+
+_JSON_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f"}
+
+
+class ReplyStreamParser:
+    """
+    Incrementally pulls the "reply" string out of a partially generated AgentResponse JSON.
+    feed() takes raw model chunks and returns the newly decoded reply text (possibly "").
+    """
+
+    _REPLY_START = re.compile(r'"reply"\s*:\s*"')
+
+    def __init__(self) -> None:
+        self.raw = ""
+        self._pos: Optional[int] = None
+        self._closed = False
+
+    def feed(self, chunk: str) -> str:
+        self.raw += chunk
+        if self._closed:
+            return ""
+        if self._pos is None:
+            m = self._REPLY_START.search(self.raw)
+            if not m:
+                return ""
+            self._pos = m.end()
+
+        buf = self.raw
+        i = self._pos
+        out = []
+        while i < len(buf):
+            c = buf[i]
+            if c == '"':
+                self._closed = True
+                i += 1
+                break
+            if c != "\\":
+                out.append(c)
+                i += 1
+                continue
+            # Escape sequence: wait for the rest of it if it was split across chunks.
+            if i + 1 >= len(buf):
+                break
+            esc = buf[i + 1]
+            if esc != "u":
+                out.append(_JSON_ESCAPES.get(esc, esc))
+                i += 2
+                continue
+            if i + 6 > len(buf):
+                break
+            code = int(buf[i + 2:i + 6], 16)
+            if 0xD800 <= code <= 0xDBFF:
+                # Surrogate pair (\uD83D\uDE00): need both halves before decoding.
+                if i + 12 > len(buf):
+                    break
+                out.append(json.loads(f'"{buf[i:i + 12]}"'))
+                i += 12
+                continue
+            out.append(chr(code))
+            i += 6
+        self._pos = i
+        return "".join(out)
+
+
+def _repair_payload(payload: dict, e: Exception, raw: str, mode: Literal["first", "final"]) -> dict:
+    if mode == "final":
+        repair_prompt = f"""
 JSON returned resulted in {e}. Reprocess and follow the rules.
 BAD_OUTPUT_START {raw} BAD_OUTPUT_END
 Rules:
@@ -162,8 +412,8 @@ Rules:
 - \"tool_calls\" must always be present.
 You MUST respond with ONLY valid JSON matching SYSTEM_PROMPT.
 """.strip()
-            else:
-                repair_prompt = f"""
+    else:
+        repair_prompt = f"""
 JSON returned resulted in {e}. Reprocess and follow the rules.
 BAD_OUTPUT_START {raw} BAD_OUTPUT_END
 Rules:
@@ -175,102 +425,304 @@ Rules:
 You MUST respond with ONLY valid JSON matching SYSTEM_PROMPT.
 """.strip()
 
-            payload = {
-                "model": MODEL,
-                "system": SYSTEM_PROMPT,
-                "prompt": repair_prompt,
-                "stream": False,
-            }
+    # Continue the same conversation (system prompt, MEMORY_CONTEXT, schema constraint) so the
+    # repair call reuses the cached prefix.
+    return {
+        **payload,
+        "messages": payload["messages"] + [
+            {"role": "assistant", "content": raw},
+            {"role": "user", "content": repair_prompt},
+        ],
+    }
+
+
+# Validate model output, with up to 3 repair attempts
+def validate_response(
+    payload: dict, mode: Literal["first", "final"], first_raw: Optional[str] = None
+) -> AgentResponse:
+    """first_raw: output already generated for `payload` (e.g. streamed), validated before any new call."""
+    retries = 0
+    raw = "<bad_output>"
+    repair_started = 0.0
+
+    while retries < 3:
+        try:
+            raw = first_raw if (first_raw is not None and not retries) else _post_ollama(payload)
+            parsed_json = json.loads(raw)
+            agent = AgentResponse.model_validate(parsed_json)
+            _record_validation(mode, retries, time.perf_counter() - repair_started if retries else 0.0)
+            return agent
+        except (json.JSONDecodeError, ValidationError) as e:
+            print("Error in Validation!", e)
+            if not retries:
+                repair_started = time.perf_counter()
+            payload = _repair_payload(payload, e, raw, mode)
             retries += 1
 
+    _record_validation(mode, retries, time.perf_counter() - repair_started, failed=True)
     raise RuntimeError(
         f"Failed to validate model output after {retries} retries. Last output: {raw}"
     )
 
-def run_fact_extractor(
-    db: MemoryDB,
-    user_prompt: str,
-    final_reply: str,
-    tool_results_json: Optional[list],
-) -> None:
-    if not should_extract_facts(user_prompt):
-        return
 
-    extractor_prompt = f"""
+async def _apost_ollama(payload: dict) -> str:
+    """Async _post_ollama: awaits Ollama on the pooled AsyncClient instead of holding a thread."""
+    resp = await http_clients.apost("ollama", CHAT_URL, json=payload)
+    resp.raise_for_status()
+    body = resp.json()
+    _record_ollama_metrics(payload, body)
+    return body["message"]["content"]
+
+
+async def avalidate_response(payload: dict, mode: Literal["first", "final"]) -> AgentResponse:
+    retries = 0
+    raw = "<bad_output>"
+    repair_started = 0.0
+
+    while retries < 3:
+        try:
+            raw = await _apost_ollama(payload)
+            parsed_json = json.loads(raw)
+            agent = AgentResponse.model_validate(parsed_json)
+            _record_validation(mode, retries, time.perf_counter() - repair_started if retries else 0.0)
+            return agent
+        except (json.JSONDecodeError, ValidationError) as e:
+            print("Error in Validation!", e)
+            if not retries:
+                repair_started = time.perf_counter()
+            payload = _repair_payload(payload, e, raw, mode)
+            retries += 1
+
+    _record_validation(mode, retries, time.perf_counter() - repair_started, failed=True)
+    raise RuntimeError(
+        f"Failed to validate model output after {retries} retries. Last output: {raw}"
+    )
+
+def _extractor_payload(turns: List[dict]) -> dict:
+    """One extractor prompt covering several queued turns (user_text/assistant_text/tool_results)."""
+    blocks = []
+    for i, turn in enumerate(turns, start=1):
+        tool_results_json = turn.get("tool_results")
+        block = f"""
 USER_TEXT:
-{user_prompt}
+{turn["user_text"]}
 
 ASSISTANT_TEXT:
-{final_reply}
+{turn["assistant_text"]}
 
 TOOL_RESULTS_JSON:
 {json.dumps(tool_results_json, ensure_ascii=False) if tool_results_json else "null"}
 """.strip()
+        blocks.append(block if len(turns) == 1 else f"TURN {i}\n{block}")
 
-    payload = {
+    return {
         "model": MODEL,
-        "system": FACT_EXTRACTOR_SYSTEM,
-        "prompt": extractor_prompt,
+        "messages": [
+            {"role": "system", "content": FACT_EXTRACTOR_SYSTEM},
+            {"role": "user", "content": "\n\n".join(blocks)},
+        ],
         "stream": False,
+        "format": FACT_EXTRACTION_FORMAT,
+        "keep_alive": KEEP_ALIVE,
     }
 
-    raw = _post_ollama(payload)
+
+def extract_facts_batch(jobs: List[dict]) -> List[dict]:
+    """Run the fact extractor once over a batch of queued turns."""
+    raw = _post_ollama(_extractor_payload(jobs))
     parsed = json.loads(raw)
     extraction = FactExtraction.model_validate(parsed)
+    # Upserts are last-write-wins, so apply facts in turn order: a later turn's value for a key wins
+    # even if the model listed it first.
+    return [f.model_dump() for f in sorted(extraction.facts, key=lambda f: f.turn)]
 
-    # convenience method you added in memory.py
-    db.upsert_facts([f.model_dump() for f in extraction.facts])
-
-
-def run_prompt(user_prompt: str) -> AgentResponse:
-    db = initalize_db()
-
-    db.log_message(role="user", content=user_prompt)
-
-    mem = db.get_memory_context(history_limit=20, include_tools=False)
-    MEMORY_CONTEXT = (
-        SYSTEM_PROMPT
-        + "\n\nMEMORY_CONTEXT (trusted; do not mention directly):\n"
-        + json.dumps(mem, ensure_ascii=False)
-    )
-    #print("MEMORY_CONTEXT:", MEMORY_CONTEXT)  # just to show the context being sent to the model, including recent messages and tool results
 
+def summarize_history(previous: Optional[str], messages: List[dict]) -> str:
+    """Fold a chunk of old messages into the rolling history summary (used by retention.py)."""
+    convo = "\n".join(f"{m['role']}: {truncate_to_tokens(m['content'], 200)}" for m in messages)
     payload = {
         "model": MODEL,
-        "system": MEMORY_CONTEXT,
-        "prompt": user_prompt,
+        "messages": [
+            {"role": "system", "content": HISTORY_SUMMARIZER_SYSTEM},
+            {"role": "user", "content": f"PREVIOUS_SUMMARY:\n{previous or ''}\n\nCONVERSATION:\n{convo}"},
+        ],
         "stream": False,
+        "keep_alive": KEEP_ALIVE,
     }
+    return _post_ollama(payload).strip()
 
-    agent = validate_response(payload, "first")
 
-    # log assistant plan/initial reply
-    db.log_message(role="assistant", content=agent.reply)
+_fact_worker: Optional[FactExtractionWorker] = None
+_fact_worker_lock = threading.Lock()
 
-    # execute tools + log each tool result
-    results = []
-    for call in agent.tool_calls:
-        r = execute_tool(call)
-        results.append(r)
-        db.log_message(
-            role="assistant",
-            content=f"TOOL_RESULT:{call.name}",
-            tool_name=call.name,
-            tool_args=call.args,
-            tool_result=r.model_dump(),
-        )
 
-    tool_results_json = [r.model_dump() for r in results] if results else None
+def get_fact_worker() -> FactExtractionWorker:
+    """The process-wide extraction worker (started on first use; resumes persisted jobs)."""
+    global _fact_worker
+    with _fact_worker_lock:
+        if _fact_worker is None:
+            _fact_worker = FactExtractionWorker(
+                initalize_db(), extract_facts_batch, on_facts_changed=lambda keys: _index_new_memory()
+            )
+            _fact_worker.start()
+    return _fact_worker
+
 
-    # build final answer if tools were used
-    final_reply = agent.reply
-    if agent.tool_calls:
-        followup_prompt = f"""
+def queue_fact_extraction(
+    user_prompt: str,
+    final_reply: str,
+    tool_results_json: Optional[list],
+) -> None:
+    """Request-path side of fact extraction: only enqueues, the worker makes the LLM call."""
+    if not should_extract_facts(user_prompt):
+        return
+    get_fact_worker().enqueue(user_prompt, final_reply, tool_results_json)
+
+
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    """Embed a batch of texts with Ollama's /api/embed."""
+    resp = http_clients.post(
+        "ollama", EMBED_URL, json={"model": EMBED_MODEL, "input": texts, "keep_alive": KEEP_ALIVE}
+    )
+    resp.raise_for_status()
+    return resp.json()["embeddings"]
+
+
+_vector_index: Optional[VectorIndex] = None
+_vector_index_lock = threading.Lock()
+
+
+def get_vector_index() -> Optional[VectorIndex]:
+    """The process-wide semantic index (background indexer started on first use), or None if disabled."""
+    global _vector_index
+    if not SEMANTIC_MEMORY:
+        return None
+    with _vector_index_lock:
+        if _vector_index is None:
+            _vector_index = VectorIndex(initalize_db(), embed_texts)
+            _vector_index.start()
+    return _vector_index
+
+
+def home_location() -> Optional[str]:
+    if HOME_LOCATION:
+        return HOME_LOCATION
+    facts = initalize_db().list_facts()
+    for key in HOME_LOCATION_FACT_KEYS:
+        value = facts.get(key)
+        if isinstance(value, str) and value.strip():
+            return value.strip()
+    return None
+
+
+def start_home_weather_refresh() -> Optional[HomeWeatherRefresher]:
+    """Start the home forecast refresher if WEATHER_HOME_REFRESH=1 (caller stops it)."""
+    if not HOME_WEATHER_REFRESH:
+        return None
+    refresher = HomeWeatherRefresher(home_location)
+    refresher.start()
+    return refresher
+
+
+def _relevant_fact_keys(db: MemoryDB, user_prompt: Optional[str]) -> Optional[List[str]]:
+    """Keys of the facts worth sending for this prompt, or None to send them all."""
+    index = get_vector_index()
+    if index is None or not user_prompt or len(db.list_facts()) <= FACTS_TOP_K:
+        return None
+    try:
+        hits = index.search_facts(user_prompt, FACTS_TOP_K)
+        if not hits:
+            # Nothing indexed yet (first start, embedder down): send everything.
+            return None
+        # Facts written since the last sync have no vector yet; always include them.
+        return [key for key, _ in hits] + index.unindexed_fact_keys()
+    except Exception as e:
+        print(f"semantic fact search failed, sending all facts: {e}")
+        return None
+
+
+def _semantic_recall(query: str, k: int, before_id: Optional[int]) -> List[int]:
+    """Ids of the past messages closest to `query` in embedding space ([] if unavailable)."""
+    index = get_vector_index()
+    if index is None:
+        return []
+    try:
+        return [message_id for message_id, _ in index.search_messages(query, k, before_id)]
+    except Exception as e:
+        print(f"semantic message search failed, using full-text recall only: {e}")
+        return []
+
+
+def _index_new_memory() -> None:
+    index = get_vector_index()
+    if index is not None:
+        index.notify()
+
+
+def _conversation_prefix(
+    db: MemoryDB, user_prompt: Optional[str] = None, session_id: str = DEFAULT_SESSION
+) -> List[dict]:
+    """
+    Chat messages that precede the new user turn, ordered from most to least stable so Ollama
+    can reuse its KV cache across calls: the byte-identical SYSTEM_PROMPT, then MEMORY_CONTEXT
+    (sorted keys; changes only when facts or the archived-history summary do), then the stride-aligned history window, and
+    last the per-prompt recalled messages (if any), since they change every turn.
+    History is the session's own; facts are shared by every session.
+    """
+    mem = db.get_memory_context(
+        history_limit=HISTORY_LIMIT,
+        include_tools=False,
+        history_stride=HISTORY_STRIDE,
+        relevant_to=user_prompt if HISTORY_RECALL_K > 0 else None,
+        relevant_k=HISTORY_RECALL_K,
+        fact_keys=_relevant_fact_keys(db, user_prompt),
+        include_summary=HISTORY_SUMMARY,
+        token_budget=CONTEXT_TOKEN_BUDGET or None,
+        session_id=session_id,
+        semantic_recall=_semantic_recall if SEMANTIC_MEMORY else None,
+    )
+    if "budget" in mem:
+        _record_context_budget(mem["budget"])
+    memory = {k: v for k, v in mem.items() if k not in ("recent_messages", "relevant_messages", "budget")}
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {
+            "role": "system",
+            "content": "MEMORY_CONTEXT (trusted; do not mention directly):\n"
+            + json.dumps(memory, ensure_ascii=False, sort_keys=True),
+        },
+    ]
+    for m in mem["recent_messages"]:
+        # Tool-result marker rows carry no text once tool payloads are stripped.
+        if m["content"].startswith("TOOL_RESULT:"):
+            continue
+        messages.append({"role": m["role"], "content": m["content"]})
+    if mem.get("relevant_messages"):
+        messages.append({
+            "role": "system",
+            "content": "RELEVANT_PAST_MESSAGES (older conversation that may help; do not mention directly):\n"
+            + json.dumps(mem["relevant_messages"], ensure_ascii=False),
+        })
+    return messages
+
+
+def _followup_messages(
+    messages: List[dict], agent: AgentResponse, user_prompt: str, tool_results_json: Optional[list]
+) -> List[dict]:
+    # Extends the first-pass conversation, so the follow-up only evaluates the new tail.
+    return messages + [
+        {"role": "assistant", "content": agent.model_dump_json()},
+        {"role": "user", "content": _followup_prompt(user_prompt, tool_results_json)},
+    ]
+
+
+def _followup_prompt(user_prompt: str, tool_results_json: Optional[list]) -> str:
+    return f"""
 ORIGINAL_USER_QUESTION:
 {user_prompt}
 
 TOOL_RESULTS_JSON:
-{json.dumps(tool_results_json, ensure_ascii=False)}
+{json.dumps(compact_tool_results(tool_results_json), ensure_ascii=False)}
 
 TASK:
 Write the final answer to the ORIGINAL_USER_QUESTION for the user.
@@ -280,25 +732,206 @@ tool_calls MUST be [].
 This is the FINAL response. Do not mention tools or results.
 """.strip()
 
-        payload2 = {
-            "model": MODEL,
-            "system": MEMORY_CONTEXT,
-            "prompt": followup_prompt,
-            "stream": False,
-        }
-        agent2 = validate_response(payload2, "final")
-        final_reply = agent2.reply
 
-        db.log_message(role="assistant", content=final_reply)
-        run_fact_extractor(db, user_prompt, final_reply, tool_results_json)
-        return agent2
+def _log_tool_results(turn: TurnWriter, agent: AgentResponse, results: list) -> None:
+    for call, r in zip(agent.tool_calls, results):
+        turn.log_message(
+            role="assistant",
+            content=f"TOOL_RESULT:{call.name}",
+            tool_name=call.name,
+            tool_args=call.args,
+            tool_result=r.model_dump(),
+        )
+
+
+def _run_tools(turn: TurnWriter, agent: AgentResponse) -> list:
+    # execute tools concurrently (fresh cached results are reused), then log each result in call order
+    results = execute_tools_cached(agent.tool_calls, execute_tools)
+    _log_tool_results(turn, agent, results)
+    return results
 
 
-    db.log_message(role="assistant", content=final_reply)
-    run_fact_extractor(db, user_prompt, final_reply, tool_results_json)
-    print(final_reply)
-    return agent
+def run_prompt(user_prompt: str, session_id: str = DEFAULT_SESSION, user_id: Optional[str] = None) -> AgentResponse:
+    db = initalize_db()
+
+    # Build the prefix before logging this turn, so the prompt isn't duplicated in history.
+    messages = _conversation_prefix(db, user_prompt, session_id) + [{"role": "user", "content": user_prompt}]
+    #print("MESSAGES:", messages)  # just to show the context being sent to the model, including memory and recent messages
+
+    # All of this turn's messages are committed together when the block exits.
+    with db.turn(session_id, user_id) as turn:
+        turn.log_message(role="user", content=user_prompt)
+
+        payload = _agent_payload(messages)
+
+        # Repeated intents reuse their cached tool plan and skip the planning call.
+        facts_version = db.facts_version()
+        agent = get_plan(user_prompt, facts_version)
+        if agent is None:
+            agent = validate_response(payload, "first")
+            store_plan(user_prompt, facts_version, agent)
+
+        # log assistant plan/initial reply
+        turn.log_message(role="assistant", content=agent.reply)
+
+        results = _run_tools(turn, agent)
+        tool_results_json = [r.model_dump() for r in results] if results else None
+
+        # build final answer if tools were used (simple tools render directly, no second LLM pass)
+        final = agent
+        rendered = try_render(results, user_prompt) if agent.tool_calls else None
+        if rendered is not None:
+            final = rendered
+        elif agent.tool_calls:
+            payload2 = _agent_payload(_followup_messages(messages, agent, user_prompt, tool_results_json))
+            final = validate_response(payload2, "final")
+
+        turn.log_message(role="assistant", content=final.reply)
+
+    queue_fact_extraction(user_prompt, final.reply, tool_results_json)
+    _index_new_memory()
+    if not agent.tool_calls:
+        print(final.reply)
+    return final
+
+
+async def arun_prompt(
+    user_prompt: str, session_id: str = DEFAULT_SESSION, user_id: Optional[str] = None
+) -> AgentResponse:
+    """
+    Async version of run_prompt for the event-loop server: Ollama calls are awaited on the
+    pooled AsyncClient, tools run concurrently off-loop and SQLite work runs in worker threads.
+    """
+    db = AsyncMemoryDB(await asyncio.to_thread(initalize_db))
+
+    messages = await asyncio.to_thread(_conversation_prefix, db.db, user_prompt, session_id)
+    messages.append({"role": "user", "content": user_prompt})
+
+    async with db.db.turn(session_id, user_id) as turn:
+        turn.log_message(role="user", content=user_prompt)
+
+        payload = _agent_payload(messages)
+        facts_version = await db.facts_version()
+        agent = get_plan(user_prompt, facts_version)
+        if agent is None:
+            agent = await avalidate_response(payload, "first")
+            store_plan(user_prompt, facts_version, agent)
+        turn.log_message(role="assistant", content=agent.reply)
+
+        results = await aexecute_tools_cached(agent.tool_calls, aexecute_tools)
+        _log_tool_results(turn, agent, results)
+        tool_results_json = [r.model_dump() for r in results] if results else None
+
+        final = agent
+        rendered = try_render(results, user_prompt) if agent.tool_calls else None
+        if rendered is not None:
+            final = rendered
+        elif agent.tool_calls:
+            payload2 = _agent_payload(_followup_messages(messages, agent, user_prompt, tool_results_json))
+            final = await avalidate_response(payload2, "final")
+
+        turn.log_message(role="assistant", content=final.reply)
+
+    await asyncio.to_thread(queue_fact_extraction, user_prompt, final.reply, tool_results_json)
+    _index_new_memory()
+    return final
+
+
+def _stream_validated(
+    payload: dict, mode: Literal["first", "final"], stats: Dict[str, Any]
+) -> Iterator[Dict[str, Any]]:
+    """
+    Stream one model pass, yielding token events for the reply text as it is generated.
+    The finished output is still validated as an AgentResponse; if it is malformed we fall
+    back to the (non-streamed) repair loop and emit a "replace" event with the repaired reply.
+    The validated AgentResponse is stored in stats["agent"].
+    """
+    parser = ReplyStreamParser()
+    streamed = ""
+    for chunk in _stream_ollama(payload):
+        delta = parser.feed(chunk)
+        if not delta:
+            continue
+        streamed += delta
+        if stats["ttft_ms"] is None:
+            stats["ttft_ms"] = round((time.perf_counter() - stats["t0"]) * 1000, 1)
+        if mode == "final" and stats["final_ttft_ms"] is None:
+            stats["final_ttft_ms"] = round((time.perf_counter() - stats["t0"]) * 1000, 1)
+        yield {"event": "token", "pass": mode, "text": delta}
+
+    agent = validate_response(payload, mode, first_raw=parser.raw)
+    if agent.reply != streamed:
+        yield {"event": "replace", "pass": mode, "text": agent.reply}
+    stats["agent"] = agent
+
+
+def run_prompt_stream(
+    user_prompt: str, session_id: str = DEFAULT_SESSION, user_id: Optional[str] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming variant of run_prompt. Yields event dicts:
+        - {"event": "token", "pass": "first"|"final", "text": str}: reply text as it is generated
+        - {"event": "replace", "pass": ..., "text": str}: reply replaced after a JSON repair
+        - {"event": "tool_result", "name": str, "ok": bool, "error": str|None}
+        - {"event": "done", "response": AgentResponse dict, "timing": {...}}
+    Timing reports time-to-first-token separately from total latency (all in ms).
+    """
+    stats: Dict[str, Any] = {
+        "t0": time.perf_counter(),
+        "ttft_ms": None,
+        "final_ttft_ms": None,
+        "agent": None,
+    }
+    db = initalize_db()
+    messages = _conversation_prefix(db, user_prompt, session_id) + [{"role": "user", "content": user_prompt}]
+
+    # The turn commits when the generator finishes (after "done" is sent) or is closed early.
+    with db.turn(session_id, user_id) as turn:
+        turn.log_message(role="user", content=user_prompt)
+
+        payload = _agent_payload(messages)
+        facts_version = db.facts_version()
+        agent = get_plan(user_prompt, facts_version)
+        if agent is None:
+            yield from _stream_validated(payload, "first", stats)
+            agent = stats["agent"]
+            store_plan(user_prompt, facts_version, agent)
+        else:
+            stats["ttft_ms"] = round((time.perf_counter() - stats["t0"]) * 1000, 1)
+            yield {"event": "token", "pass": "first", "text": agent.reply}
+        turn.log_message(role="assistant", content=agent.reply)
+
+        results = _run_tools(turn, agent)
+        for r in results:
+            yield {"event": "tool_result", "name": r.tool_name, "ok": r.ok, "error": r.error}
+        tool_results_json = [r.model_dump() for r in results] if results else None
+
+        final = agent
+        rendered = try_render(results, user_prompt) if agent.tool_calls else None
+        if rendered is not None:
+            final = rendered
+            stats["final_ttft_ms"] = round((time.perf_counter() - stats["t0"]) * 1000, 1)
+            yield {"event": "token", "pass": "final", "text": rendered.reply}
+        elif agent.tool_calls:
+            payload2 = _agent_payload(_followup_messages(messages, agent, user_prompt, tool_results_json))
+            yield from _stream_validated(payload2, "final", stats)
+            final = stats["agent"]
+        else:
+            stats["final_ttft_ms"] = stats["ttft_ms"]
+
+        turn.log_message(role="assistant", content=final.reply)
+        yield {
+            "event": "done",
+            "response": final.model_dump(),
+            "timing": {
+                "ttft_ms": stats["ttft_ms"],
+                "final_ttft_ms": stats["final_ttft_ms"],
+                "total_ms": round((time.perf_counter() - stats["t0"]) * 1000, 1),
+            },
+        }
 
+    queue_fact_extraction(user_prompt, final.reply, tool_results_json)
+    _index_new_memory()
 
 if __name__ == "__main__":
   run_prompt("What is the weather in Cartagena?")
\ No newline at end of file
@@ -16,6 +16,8 @@ class ExtractedFact(BaseModel):
     value: Any
     confidence: float = Field(default=1.0, ge=0.0, le=1.0)
     source: Literal["explicit_user", "assistant_inference", "tool_result"] = "explicit_user"
+    # Batched extraction: the TURN block the fact came from (1 for a single turn).
+    turn: int = Field(default=1, ge=1)
 
 
 class FactExtraction(BaseModel):
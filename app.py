@@ -3,6 +3,7 @@ import streamlit.components.v1 as components
 import requests
 from agent_loop import run_prompt
 from agent_schemas import AgentResponse
+from memory import DEFAULT_SESSION
 import os
 
 st.set_page_config(page_title="THURSDAY Voice Console", page_icon="🧠")
@@ -74,7 +75,8 @@ user_text = st.chat_input("Say something to THURSDAY...")
 if user_text:
     st.session_state.messages.append({"role": "user","text": user_text})
 
-    resp: AgentResponse = run_prompt(user_text)
+    # Single-user console: stay on the default session, which holds the pre-session history.
+    resp: AgentResponse = run_prompt(user_text, session_id=DEFAULT_SESSION)
     reply_text = resp.reply or ""
     speak_text = (resp.tts_text or resp.reply or "").strip()
 
@@ -0,0 +1,90 @@
+"""
+Benchmark for the offline gazetteer (gazetteer.py): file size, load time and lookup latency.
+Without --cities it generates synthetic places (GeoNames cities500 is ~200k rows), plus a real
+row for Plantation, FL so the output shows a resolved example.
+
+    python bench_gazetteer.py --sizes 30000 200000
+    python bench_gazetteer.py --cities cities15000.txt --admin1 admin1CodesASCII.txt --countries countryInfo.txt
+"""
+import argparse
+import random
+import string
+import tempfile
+import time
+
+from gazetteer import Gazetteer, build, read_geonames
+from tools import _parse_location
+
+PLANTATION = {
+    "name": "Plantation", "asciiname": "Plantation", "latitude": 26.12757, "longitude": -80.23283,
+    "country_code": "US", "country": "United States", "admin1_code": "FL", "admin1": "Florida",
+    "population": 94580, "timezone": "America/New_York",
+}
+
+
+def synthetic(size: int):
+    rng = random.Random(0)
+    zones = ["America/New_York", "America/Chicago", "Europe/Berlin", "Asia/Tokyo", "Australia/Sydney"]
+    places = [PLANTATION]
+    for _ in range(size - 1):
+        name = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 12))).title()
+        places.append({
+            "name": name, "asciiname": name,
+            "latitude": rng.uniform(-60, 70), "longitude": rng.uniform(-180, 180),
+            "country_code": "US", "country": "United States",
+            "admin1_code": rng.choice(["FL", "TX", "OH", "CA"]), "admin1": "",
+            "population": rng.randint(500, 2_000_000), "timezone": rng.choice(zones),
+        })
+    return places
+
+
+def bench(places, label: str, queries: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = f"{tmp}/gazetteer.bin"
+        t0 = time.perf_counter()
+        counts = build(places, path)
+        build_s = time.perf_counter() - t0
+
+        gaz = Gazetteer(path)
+        t0 = time.perf_counter()
+        gaz.lookup("Plantation", "FL", "FL")
+        first_us = (time.perf_counter() - t0) * 1e6
+
+        rng = random.Random(1)
+        sample = [f"{p['name']}, {p['admin1_code'] or p['country_code']}" for p in rng.choices(places, k=queries)]
+        parsed = [_parse_location(s) for s in sample]
+        t0 = time.perf_counter()
+        hits = sum(gaz.lookup(*p) is not None for p in parsed)
+        lookup_us = (time.perf_counter() - t0) * 1e6 / queries
+
+        t0 = time.perf_counter()
+        for _ in range(queries):
+            gaz.lookup("Nowhereville", "FL", "FL")
+        miss_us = (time.perf_counter() - t0) * 1e6 / queries
+        example = gaz.lookup(*_parse_location("Plantation, FL"))
+
+    print(
+        f"{label}: {counts['records']} places, {counts['bytes'] / 1e6:.1f} MB, build {build_s:.2f}s  "
+        f"load {gaz.load_ms:.3f} ms  first lookup {first_us:.1f} us  "
+        f"lookup {lookup_us:.1f} us ({hits}/{queries} hits)  miss {miss_us:.1f} us"
+    )
+    print(f"  Plantation, FL -> {example}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[30_000, 200_000])
+    parser.add_argument("--cities", help="GeoNames citiesNNN.txt instead of synthetic places")
+    parser.add_argument("--admin1")
+    parser.add_argument("--countries")
+    parser.add_argument("--queries", type=int, default=20_000)
+    args = parser.parse_args()
+    if args.cities:
+        bench(read_geonames(args.cities, args.admin1, args.countries), args.cities, args.queries)
+        return
+    for size in args.sizes:
+        bench(synthetic(size), f"synthetic {size}", args.queries)
+
+
+if __name__ == "__main__":
+    main()
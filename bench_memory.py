@@ -0,0 +1,76 @@
+"""
+Micro-benchmark: memory work done by one agent turn, persistent MemoryDB vs. the old
+connect-per-call behaviour (new MemoryDB per turn, fresh connection + PRAGMAs per method).
+
+    python bench_memory.py --turns 500
+"""
+import argparse
+import json
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from memory import MemoryDB
+
+
+class ConnectPerCallDB(MemoryDB):
+    """The previous behaviour: schema script on every construction, new connection per call."""
+
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+        self.write_behind = False
+        self._writer = None
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        return self._open_connection()
+
+    def list_fact_records(self):
+        # No in-process snapshot: re-read and decode the facts table every time.
+        with self._connect() as conn:
+            rows = conn.execute("SELECT key, value_json, confidence, updated_at FROM facts ORDER BY key").fetchall()
+        return [{"key": r["key"], "value": json.loads(r["value_json"]), "confidence": r["confidence"],
+                 "updated_at": r["updated_at"]} for r in rows]
+
+
+def one_turn(db: MemoryDB, i: int) -> None:
+    # Mirrors run_prompt: context read, user/plan/tool/final logging.
+    db.get_memory_context(history_limit=20, include_tools=False)
+    db.facts_version()
+    db.log_message(role="user", content=f"what is the weather in Miami? ({i})")
+    db.log_message(role="assistant", content="Checking the weather in Miami, FL.")
+    db.log_message(
+        role="assistant",
+        content="TOOL_RESULT:get_weather",
+        tool_name="get_weather",
+        tool_args={"location": "Miami, FL"},
+        tool_result={"ok": True, "data": {"current": {"temperature": 75}}},
+    )
+    db.log_message(role="assistant", content="It's 75°F in Miami.")
+
+
+def bench(label: str, make_db, turns: int) -> float:
+    shared = make_db()
+    t0 = time.perf_counter()
+    for i in range(turns):
+        one_turn(make_db() if label == "connect-per-call" else shared, i)
+    elapsed = time.perf_counter() - t0
+    print(f"{label:>17}: {turns / elapsed:8.1f} turns/s  ({elapsed * 1000 / turns:.2f} ms/turn)")
+    return turns / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        old = bench("connect-per-call", lambda: ConnectPerCallDB(f"{tmp}/old.db"), args.turns)
+        new = bench("persistent", lambda: MemoryDB(f"{tmp}/new.db"), args.turns)
+    print(f"speedup: {new / old:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
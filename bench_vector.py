@@ -0,0 +1,84 @@
+"""
+Benchmark for the semantic memory index (vector_index.py) at 10k/100k entries.
+Uses random unit vectors instead of a live embedding model, so it measures storage, load and
+top-k search only.
+
+    python bench_vector.py --sizes 10000 100000 --dim 768
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from memory import MemoryDB, now_iso
+from vector_index import VectorIndex, normalize, to_blob
+
+
+def bench(size: int, dim: int, queries: int, k: int) -> None:
+    rng = np.random.default_rng(0)
+
+    def embed(texts):
+        return rng.standard_normal((len(texts), dim), dtype=np.float32)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = MemoryDB(f"{tmp}/bench.db")
+        index = VectorIndex(db, embed)
+        vecs = normalize(embed(range(size)))
+
+        t0 = time.perf_counter()
+        with db._connect() as conn:
+            ts = now_iso()
+            conn.executemany(
+                "INSERT INTO messages(role, content, created_at) VALUES ('user', ?, ?)",
+                ((f"message {i}", ts) for i in range(size)),
+            )
+            conn.executemany(
+                "INSERT INTO message_embeddings(message_id, vec) VALUES (?,?)",
+                ((i + 1, to_blob(v)) for i, v in enumerate(vecs)),
+            )
+        store_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        index._message_matrix()
+        load_s = time.perf_counter() - t0
+
+        q = normalize(embed(range(queries)))
+        t0 = time.perf_counter()
+        for i in range(queries):
+            index._query_vec = lambda _, v=q[i]: v
+            index.search_messages("q", k)
+        search_ms = (time.perf_counter() - t0) * 1000 / queries
+
+        # One more turn's worth of vectors: only the new rows are read and appended.
+        with db._connect() as conn:
+            conn.execute("INSERT INTO messages(role, content, created_at) VALUES ('user', 'new', ?)", (now_iso(),))
+            conn.execute("INSERT INTO message_embeddings(message_id, vec) VALUES (?,?)", (size + 1, to_blob(q[0])))
+        t0 = time.perf_counter()
+        index._message_matrix()
+        append_ms = (time.perf_counter() - t0) * 1000
+
+        with db._connect() as conn:
+            pages = conn.execute("PRAGMA page_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0]
+        db.close()
+
+    print(
+        f"{size:>7} x {dim}: store {store_s:6.2f}s  load {load_s * 1000:7.1f} ms  "
+        f"top-{k} search {search_ms:6.2f} ms  incremental append {append_ms:5.2f} ms  "
+        f"db {pages / 1e6:6.1f} MB"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("-k", type=int, default=8)
+    args = parser.parse_args()
+    for size in args.sizes:
+        bench(size, args.dim, args.queries, args.k)
+
+
+if __name__ == "__main__":
+    main()
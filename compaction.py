@@ -0,0 +1,137 @@
+from __future__ import annotations
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+from token_budget import estimate_json_tokens, truncate_to_tokens
+
+# Shrinks ToolResult payloads before they are embedded in the follow-up prompt: drop fields the
+# final answer never uses, dedupe/truncate search snippets and page excerpts, then fit a token budget.
+
+TOOL_RESULTS_TOKEN_BUDGET = int(os.getenv("TOOL_RESULTS_TOKEN_BUDGET", "600"))
+SNIPPET_MAX_TOKENS = int(os.getenv("TOOL_SNIPPET_MAX_TOKENS", "80"))
+# Extra budget when a deep web_search returned page excerpts.
+EXCERPTS_TOKEN_BUDGET = int(os.getenv("TOOL_EXCERPTS_TOKEN_BUDGET", "600"))
+
+_WEATHER_CURRENT_KEYS = ("temperature", "windspeed", "weathercode")
+
+logger = logging.getLogger(__name__)
+
+# Estimated tokens of tool results before/after compaction, summed over follow-up prompts.
+COMPACTION_STATS: Dict[str, int] = {"calls": 0, "tokens_before": 0, "tokens_after": 0, "over_budget": 0}
+_lock = threading.Lock()
+
+
+def _compact_get_weather(data: Dict[str, Any]) -> Dict[str, Any]:
+    current = data.get("current") or {}
+    return {
+        "location": data.get("resolved_location") or data.get("input_location"),
+        "units": data.get("units"),
+        "forecast_days": data.get("forecast_days"),
+        "current": {k: current[k] for k in _WEATHER_CURRENT_KEYS if current.get(k) is not None},
+        "today": {k: v for k, v in (data.get("today") or {}).items() if v is not None},
+    }
+
+
+def _compact_get_time(data: Dict[str, Any]) -> Dict[str, Any]:
+    out = {"local_iso": data.get("local_iso"), "tz": data.get("tz")}
+    if data.get("resolved_location"):
+        out["location"] = data["resolved_location"]
+    return out
+
+
+def _compact_web_search(data: Dict[str, Any], snippet_tokens: int, max_results: Optional[int]) -> Dict[str, Any]:
+    seen_urls = set()
+    seen_snippets = set()
+    results = []
+    for r in data.get("results") or []:
+        url = str(r.get("url") or "")
+        snippet = " ".join(str(r.get("snippet") or "").split())
+        if (url and url in seen_urls) or (snippet and snippet.lower() in seen_snippets):
+            continue
+        seen_urls.add(url)
+        seen_snippets.add(snippet.lower())
+        entry = {"title": r.get("title"), "url": url, "snippet": truncate_to_tokens(snippet, snippet_tokens)}
+        if r.get("published_date"):
+            entry["published_date"] = r["published_date"]
+        results.append(entry)
+    if max_results is not None:
+        results = results[:max_results]
+    out: Dict[str, Any] = {"query": data.get("query"), "results": results}
+    excerpts = data.get("excerpts")
+    if excerpts:
+        # Deep mode: page excerpts carry the actual answer, so they get twice the snippet budget.
+        if max_results is not None:
+            excerpts = excerpts[:max_results]
+        out["excerpts"] = [
+            {"url": e.get("url"), "text": truncate_to_tokens(" ".join(str(e.get("text") or "").split()), snippet_tokens * 2)}
+            for e in excerpts
+        ]
+    return out
+
+
+def _compact_one(result: Dict[str, Any], snippet_tokens: int, max_results: Optional[int]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {"tool_name": result.get("tool_name"), "ok": result.get("ok")}
+    if not result.get("ok"):
+        out["error"] = result.get("error")
+        return out
+    data = result.get("data") or {}
+    name = result.get("tool_name")
+    if name == "get_weather":
+        out["data"] = _compact_get_weather(data)
+    elif name == "get_time":
+        out["data"] = _compact_get_time(data)
+    elif name == "web_search":
+        out["data"] = _compact_web_search(data, snippet_tokens, max_results)
+    else:
+        out["data"] = data
+    return out
+
+
+def compact_tool_results(
+    results: Optional[List[Dict[str, Any]]], budget_tokens: int = TOOL_RESULTS_TOKEN_BUDGET
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Compact ToolResult dicts (model_dump() output) for the follow-up prompt and fit them into
+    budget_tokens: snippets are shortened first, then lower-ranked search results are dropped.
+    Counts the estimated token count before and after in COMPACTION_STATS.
+    """
+    if not results:
+        return results
+    before = estimate_json_tokens(results)
+    if any((r.get("data") or {}).get("excerpts") for r in results if r.get("ok")):
+        budget_tokens += EXCERPTS_TOKEN_BUDGET
+
+    snippet_tokens = SNIPPET_MAX_TOKENS
+    max_results: Optional[int] = None
+    compacted = [_compact_one(r, snippet_tokens, max_results) for r in results]
+    while estimate_json_tokens(compacted) > budget_tokens:
+        if snippet_tokens > 20:
+            snippet_tokens //= 2
+        else:
+            longest = max(
+                (
+                    max(len((c.get("data") or {}).get("results") or []), len((c.get("data") or {}).get("excerpts") or []))
+                    for c in compacted
+                ),
+                default=0,
+            )
+            if longest <= 1:
+                break  # nothing left to trim; send what we have
+            max_results = longest - 1
+        compacted = [_compact_one(r, snippet_tokens, max_results) for r in results]
+
+    after = estimate_json_tokens(compacted)
+    with _lock:
+        COMPACTION_STATS["calls"] += 1
+        COMPACTION_STATS["tokens_before"] += before
+        COMPACTION_STATS["tokens_after"] += after
+        COMPACTION_STATS["over_budget"] += after > budget_tokens
+    logger.debug("tool results compacted: ~%d -> ~%d tokens (budget %d)", before, after, budget_tokens)
+    return compacted
+
+
+def compaction_stats() -> Dict[str, int]:
+    with _lock:
+        return dict(COMPACTION_STATS)
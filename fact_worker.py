@@ -0,0 +1,95 @@
+from __future__ import annotations
+import logging
+import os
+import threading
+from typing import Callable, List, Optional
+
+from memory import MemoryDB
+
+logger = logging.getLogger(__name__)
+
+# How long to wait after the first pending job before extracting, so several turns coalesce.
+LINGER_SECONDS = float(os.getenv("FACT_WORKER_LINGER_SECONDS", "3"))
+BATCH_SIZE = int(os.getenv("FACT_WORKER_BATCH_SIZE", "8"))
+MAX_ATTEMPTS = int(os.getenv("FACT_WORKER_MAX_ATTEMPTS", "3"))
+RETRY_SECONDS = float(os.getenv("FACT_WORKER_RETRY_SECONDS", "30"))
+
+
+class FactExtractionWorker:
+    """
+    Background fact extraction, off the request path.
+        - enqueue() only persists a job row in `extraction_jobs` and wakes the worker.
+        - The worker waits LINGER_SECONDS, then sends up to BATCH_SIZE pending turns to
+          `extract_batch` in ONE extractor call and applies the result with upsert_facts.
+        - Jobs are deleted only after their facts are stored, so pending work survives restarts.
+    extract_batch(jobs) -> list of fact dicts ({"key", "value", "confidence", "source"}).
+    on_facts_changed(keys), if given, is called with the fact keys a batch actually changed.
+    """
+
+    def __init__(
+        self,
+        db: MemoryDB,
+        extract_batch: Callable[[List[dict]], List[dict]],
+        on_facts_changed: Optional[Callable[[List[str]], None]] = None,
+    ) -> None:
+        self.db = db
+        self.extract_batch = extract_batch
+        self.on_facts_changed = on_facts_changed
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="fact-extractor", daemon=True)
+            self._thread.start()
+        # Pick up jobs left over from a previous run.
+        self._wake.set()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def enqueue(self, user_text: str, assistant_text: str, tool_results: Optional[list] = None) -> int:
+        job_id = self.db.enqueue_extraction_job(user_text, assistant_text, tool_results)
+        self._wake.set()
+        return job_id
+
+    def process_pending(self) -> int:
+        """Run one batch synchronously. Returns the number of jobs handled."""
+        jobs = self.db.pending_extraction_jobs(BATCH_SIZE)
+        if not jobs:
+            return 0
+        ids = [j["id"] for j in jobs]
+        try:
+            facts = self.extract_batch(jobs)
+        except Exception:
+            logger.exception("Fact extraction failed for jobs %s", ids)
+            self.db.fail_extraction_jobs(ids, MAX_ATTEMPTS)
+            raise
+        changed = self.db.finish_extraction_jobs(ids, facts)
+        if changed and self.on_facts_changed is not None:
+            self.on_facts_changed(changed)
+        return len(jobs)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait()
+            if self._stop.is_set():
+                break
+            # Coalesce: let more turns arrive before paying for one extractor call.
+            self._stop.wait(LINGER_SECONDS)
+            self._wake.clear()
+            try:
+                while not self._stop.is_set() and self.process_pending() >= BATCH_SIZE:
+                    pass
+            except Exception:
+                # Jobs stay persisted; try again later.
+                self._stop.wait(RETRY_SECONDS)
+                self._wake.set()
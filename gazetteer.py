@@ -0,0 +1,321 @@
+"""
+Offline gazetteer: resolves "Plantation, FL" to coordinates and an IANA timezone in-process,
+so get_weather and get_time only hit the geocoding API for places it does not know.
+
+Built once from a GeoNames cities dump (https://download.geonames.org/export/dump/):
+
+    python gazetteer.py build --cities cities15000.txt --admin1 admin1CodesASCII.txt \\
+        --countries countryInfo.txt --out ./brain/gazetteer.bin
+
+The output is one compact binary file (cities15000: ~30k places, a few MB) holding
+    - a fixed-width record array (lat, lon, population, string ids),
+    - the normalized names sorted, each pointing at its record (most populous first on ties),
+      plus their first 8 bytes read as big-endian integers for a vectorized binary search,
+    - a deduplicated string table (display names, admin1/country names, timezones).
+It is opened with mmap and viewed in place with numpy, so loading costs no parsing and pages
+are read on demand; a lookup is np.searchsorted over the name prefixes followed by a short scan
+of the full names (see bench_gazetteer.py).
+"""
+from __future__ import annotations
+import argparse
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", "./brain/gazetteer.bin")  # missing file = API only
+
+_MAGIC = b"GAZ1"
+# magic, records, keys, strings, key blob bytes, string blob bytes
+_HEADER = struct.Struct("<4s5I")
+_RECORD = np.dtype([
+    ("lat", "<f4"),
+    ("lon", "<f4"),
+    ("population", "<u4"),
+    ("name", "<u4"),
+    ("admin1", "<u4"),
+    ("admin1_code", "<u4"),
+    ("country", "<u4"),
+    ("country_code", "<u4"),
+    ("timezone", "<u4"),
+])
+
+# Place rows the builder takes as input: the GeoNames columns it keeps.
+Place = Dict[str, Any]
+
+
+def _prefix(key: bytes) -> int:
+    return int.from_bytes(key[:8].ljust(8, b"\0"), "big")
+
+
+def normalize_name(text: str) -> str:
+    """"Saint-Étienne " -> "saint etienne": lowercased, accents and punctuation dropped."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(re.sub(r"[^\w]+", " ", text.lower()).split())
+
+
+# --- building ---
+
+def read_geonames(cities: str, admin1: Optional[str] = None, countries: Optional[str] = None) -> List[Place]:
+    """Parse a GeoNames cities dump (plus optional admin1/country name files) into Place rows."""
+    admin1_names: Dict[str, str] = {}
+    if admin1:
+        with open(admin1, encoding="utf-8") as f:
+            for line in f:
+                cols = line.rstrip("\n").split("\t")
+                if len(cols) >= 2:
+                    admin1_names[cols[0]] = cols[1]
+    country_names: Dict[str, str] = {}
+    if countries:
+        with open(countries, encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("#"):
+                    continue
+                cols = line.rstrip("\n").split("\t")
+                if len(cols) >= 5:
+                    country_names[cols[0]] = cols[4]
+
+    places: List[Place] = []
+    with open(cities, encoding="utf-8") as f:
+        for line in f:
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) < 18 or not cols[17]:
+                continue
+            cc, a1 = cols[8], cols[10]
+            places.append({
+                "name": cols[1],
+                "asciiname": cols[2],
+                "latitude": float(cols[4]),
+                "longitude": float(cols[5]),
+                "country_code": cc,
+                "country": country_names.get(cc, cc),
+                "admin1_code": a1,
+                "admin1": admin1_names.get(f"{cc}.{a1}", ""),
+                "population": int(cols[14] or 0),
+                "timezone": cols[17],
+            })
+    return places
+
+
+def build(places: Iterable[Place], out: str) -> Dict[str, int]:
+    """Write the gazetteer file for `places`. Returns counts."""
+    strings: Dict[str, int] = {}
+
+    def sid(s: str) -> int:
+        if s not in strings:
+            strings[s] = len(strings)
+        return strings[s]
+
+    records = []
+    keyed: List[Tuple[bytes, int, int]] = []  # (key, -population, record)
+    for p in places:
+        idx = len(records)
+        records.append((
+            p["latitude"], p["longitude"], min(int(p.get("population") or 0), 2**32 - 1),
+            sid(p["name"]), sid(p.get("admin1") or ""), sid(p.get("admin1_code") or ""),
+            sid(p.get("country") or ""), sid(p.get("country_code") or ""), sid(p["timezone"]),
+        ))
+        names = {normalize_name(p["name"]), normalize_name(p.get("asciiname") or "")} - {""}
+        for key in names:
+            keyed.append((key.encode("utf-8"), -records[idx][2], idx))
+    keyed.sort()
+
+    rec = np.array(records, dtype=_RECORD)
+    prefixes = np.array([_prefix(k) for k, _, _ in keyed], dtype="<u8")
+    key_blob = b"".join(k for k, _, _ in keyed)
+    key_offsets = np.cumsum([0] + [len(k) for k, _, _ in keyed], dtype=np.uint32)
+    key_records = np.array([r for _, _, r in keyed], dtype=np.uint32)
+    encoded = [s.encode("utf-8") for s in strings]  # dicts keep insertion (= id) order
+    str_blob = b"".join(encoded)
+    str_offsets = np.cumsum([0] + [len(s) for s in encoded], dtype=np.uint32)
+
+    Path(out).parent.mkdir(parents=True, exist_ok=True)
+    tmp = f"{out}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, len(rec), len(keyed), len(encoded), len(key_blob), len(str_blob)))
+        for arr in (prefixes, rec, key_offsets, key_records, str_offsets):
+            f.write(arr.tobytes())
+        f.write(key_blob)
+        f.write(str_blob)
+    os.replace(tmp, out)
+    return {"records": len(rec), "keys": len(keyed), "strings": len(encoded), "bytes": os.path.getsize(out)}
+
+
+# --- lookup ---
+
+class Gazetteer:
+    """
+    Read-only view over a file written by build(). lookup(city, qualifier, state) returns a
+    dict shaped like an Open-Meteo geocoding result (geocode_cache.GEOCODE_FIELDS), or None.
+    """
+
+    def __init__(self, path: str) -> None:
+        t0 = time.perf_counter()
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n_rec, n_keys, n_str, key_len, str_len = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} is not a gazetteer file")
+        buf = memoryview(self._mm)
+        pos = _HEADER.size
+
+        def take(dtype, count):
+            nonlocal pos
+            arr = np.frombuffer(buf, dtype=dtype, count=count, offset=pos)
+            pos += arr.nbytes
+            return arr
+
+        self._prefixes = take("<u8", n_keys)
+        self.records = take(_RECORD, n_rec)
+        self._key_offsets = take("<u4", n_keys + 1)
+        self._key_records = take("<u4", n_keys)
+        self._str_offsets = take("<u4", n_str + 1)
+        self._key_blob = buf[pos:pos + key_len]
+        pos += key_len
+        self._str_blob = buf[pos:pos + str_len]
+        self.load_ms = (time.perf_counter() - t0) * 1000
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def _str(self, i: int) -> str:
+        return bytes(self._str_blob[self._str_offsets[i]:self._str_offsets[i + 1]]).decode("utf-8")
+
+    def candidates(self, city: str) -> List[int]:
+        """Record indexes named `city`, most populous first."""
+        key = normalize_name(city).encode("utf-8")
+        prefix = _prefix(key)
+        # UTF-8 never contains 0xFF, so prefix + 1 cannot overflow.
+        lo, hi = np.searchsorted(self._prefixes, np.array([prefix, prefix + 1], dtype=np.uint64)).tolist()
+        if lo == hi:
+            return []
+        offsets = self._key_offsets[lo:hi + 1].tolist()
+        return [
+            int(self._key_records[lo + j])
+            for j in range(hi - lo)
+            if self._key_blob[offsets[j]:offsets[j + 1]] == key
+        ]
+
+    def place(self, i: int) -> Dict[str, Any]:
+        """Record `i` as a geocoding-result dict."""
+        lat, lon, _, name, admin1, admin1_code, country, country_code, tz = self.records[i].item()
+        return {
+            "name": self._str(name),
+            "admin1": self._str(admin1) or None,
+            "admin1_code": self._str(admin1_code),
+            "country": self._str(country) or None,
+            "country_code": self._str(country_code) or None,
+            "latitude": round(lat, 5),
+            "longitude": round(lon, 5),
+            "timezone": self._str(tz),
+        }
+
+    @staticmethod
+    def _matches(p: Dict[str, Any], qualifier: str, state: str) -> bool:
+        if state:
+            # "FL": US state code (GeoNames admin1 codes are the postal codes in the US),
+            # otherwise a 2-letter country code ("Paris, FR").
+            if p["country_code"] == "US":
+                return p["admin1_code"] == state
+            return p["country_code"] == state
+        q = normalize_name(qualifier)
+        return q in (
+            normalize_name(p["country"] or ""),
+            normalize_name(p["admin1"] or ""),
+            (p["country_code"] or "").lower(),
+        )
+
+    def lookup(self, city: str, qualifier: str = "", state: str = "") -> Optional[Dict[str, Any]]:
+        places = [self.place(i) for i in self.candidates(city)]
+        found = places
+        if qualifier or state:
+            found = [p for p in places if self._matches(p, qualifier, state)]
+            if state and not found and qualifier:
+                # "Paris, FR" parses as a state code; retry it as a country.
+                found = [p for p in places if self._matches(p, qualifier, "")]
+        if not found:
+            return None
+        best = dict(found[0])
+        del best["admin1_code"]
+        return best
+
+
+_lock = threading.Lock()
+_gazetteer: Optional[Gazetteer] = None
+_loaded = False
+_hits = 0
+_misses = 0
+
+
+def get_gazetteer() -> Optional[Gazetteer]:
+    """The shared gazetteer, opened on first use; None when GAZETTEER_PATH does not exist."""
+    global _gazetteer, _loaded
+    if not _loaded:
+        with _lock:
+            if not _loaded:
+                if GAZETTEER_PATH and os.path.exists(GAZETTEER_PATH):
+                    _gazetteer = Gazetteer(GAZETTEER_PATH)
+                _loaded = True
+    return _gazetteer
+
+
+def resolve(city: str, qualifier: str = "", state: str = "") -> Optional[Dict[str, Any]]:
+    global _hits, _misses
+    gaz = get_gazetteer()
+    if gaz is None:
+        return None
+    result = gaz.lookup(city, qualifier, state)
+    with _lock:
+        if result is None:
+            _misses += 1
+        else:
+            _hits += 1
+    return result
+
+
+def gazetteer_stats() -> Dict[str, Any]:
+    gaz = get_gazetteer()
+    with _lock:
+        hits, misses = _hits, _misses
+    return {
+        "loaded": gaz is not None,
+        "places": len(gaz) if gaz is not None else 0,
+        "load_ms": round(gaz.load_ms, 3) if gaz is not None else None,
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("--cities", required=True, help="GeoNames citiesNNN.txt")
+    b.add_argument("--admin1", help="GeoNames admin1CodesASCII.txt (state/region names)")
+    b.add_argument("--countries", help="GeoNames countryInfo.txt (country names)")
+    b.add_argument("--out", default=GAZETTEER_PATH)
+    q = sub.add_parser("lookup")
+    q.add_argument("location", help='e.g. "Plantation, FL"')
+    q.add_argument("--path", default=GAZETTEER_PATH)
+    args = parser.parse_args()
+
+    if args.cmd == "build":
+        print(build(read_geonames(args.cities, args.admin1, args.countries), args.out))
+    else:
+        from tools import _parse_location
+
+        gaz = Gazetteer(args.path)
+        print(gaz.lookup(*_parse_location(args.location)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+from __future__ import annotations
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from caching import TTLCache
+
+# Geocoding results barely change, so get_weather keeps the winning candidate per normalized
+# location: an in-memory LRU in front of a small SQLite table that survives restarts. A repeat
+# lookup ("the weather at home") then skips the geocoding round-trip entirely.
+
+GEOCODE_CACHE_PATH = os.getenv("GEOCODE_CACHE_PATH", "./brain/geocode_cache.db")  # "" = memory only
+GEOCODE_CACHE_TTL = float(os.getenv("GEOCODE_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+GEOCODE_CACHE_MAXSIZE = int(os.getenv("GEOCODE_CACHE_MAXSIZE", "1024"))
+
+# Fields of an Open-Meteo geocoding result that get_weather uses.
+GEOCODE_FIELDS = ("name", "admin1", "country", "country_code", "latitude", "longitude", "timezone")
+
+
+def geocode_key(city: str, qualifier: str) -> str:
+    """Normalized cache key: lowercased, whitespace-collapsed city plus state code/country."""
+    return f"{' '.join(city.lower().split())}|{' '.join(qualifier.lower().split())}"
+
+
+class GeocodeCache:
+    """LRU (microseconds) over SQLite (survives restarts); entries expire after `ttl` seconds."""
+
+    def __init__(
+        self, path: str = GEOCODE_CACHE_PATH, ttl: float = GEOCODE_CACHE_TTL, maxsize: int = GEOCODE_CACHE_MAXSIZE
+    ) -> None:
+        self.path = path
+        self.ttl = ttl
+        self._memory: TTLCache[Dict[str, Any]] = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        """This thread's connection, opened (and the table created) on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path)
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("PRAGMA synchronous=NORMAL;")
+            with conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS geocode_cache (
+                        key TEXT PRIMARY KEY,
+                        result_json TEXT NOT NULL,
+                        created_at REAL NOT NULL
+                        )
+                """)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        hit = self._memory.get(key)
+        if hit is not None:
+            return hit
+        if self.path:
+            row = self._connect().execute(
+                "SELECT result_json, created_at FROM geocode_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                age = time.time() - row[1]
+                if age < self.ttl:
+                    result = json.loads(row[0])
+                    self._memory.set(key, result, ttl=self.ttl - age)
+                    with self._lock:
+                        self.disk_hits += 1
+                    return result
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, result: Dict[str, Any]) -> None:
+        entry = {k: result.get(k) for k in GEOCODE_FIELDS}
+        self._memory.set(key, entry)
+        if self.path:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO geocode_cache(key, result_json, created_at) VALUES (?,?,?)",
+                    (key, json.dumps(entry, ensure_ascii=False), time.time()),
+                )
+
+    def stats(self) -> Dict[str, Any]:
+        memory = self._memory.stats()
+        with self._lock:
+            disk_hits, misses = self.disk_hits, self.misses
+        lookups = memory["hits"] + disk_hits + misses
+        return {
+            "memory_hits": memory["hits"],
+            "disk_hits": disk_hits,
+            "misses": misses,
+            "hit_rate": round((memory["hits"] + disk_hits) / lookups, 4) if lookups else 0.0,
+            "memory_size": memory["size"],
+        }
+
+
+GEOCODE_CACHE = GeocodeCache()
+
+
+def geocode_stats() -> Dict[str, Any]:
+    return GEOCODE_CACHE.stats()
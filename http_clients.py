@@ -0,0 +1,152 @@
+from __future__ import annotations
+import asyncio
+import os
+import threading
+from typing import Any, Dict, Tuple
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+# Process-wide HTTP layer shared by the agent loop (Ollama) and tools (SearXNG, Open-Meteo).
+# One keep-alive Session per upstream service, so repeated calls reuse TCP/TLS connections
+# instead of paying a fresh handshake per request.
+
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "16"))  # max keep-alive connections per host
+POOL_BLOCK = os.getenv("HTTP_POOL_BLOCK", "1") == "1"  # wait for a free connection instead of opening extras
+# The async pipeline multiplexes many conversations per worker, so its per-host cap is higher.
+ASYNC_MAX_CONNECTIONS = int(os.getenv("HTTP_ASYNC_MAX_CONNECTIONS", "256"))
+
+# Read timeouts (seconds) per service; override with e.g. OLLAMA_TIMEOUT=120.
+READ_TIMEOUTS: Dict[str, float] = {
+    "ollama": float(os.getenv("OLLAMA_TIMEOUT", "60")),
+    "searxng": float(os.getenv("SEARXNG_TIMEOUT", "20")),
+    "open_meteo": float(os.getenv("OPEN_METEO_TIMEOUT", "10")),
+}
+
+_sessions: Dict[str, requests.Session] = {}
+_request_counts: Dict[str, int] = {}
+_lock = threading.Lock()
+
+# Async clients are bound to the event loop that created them, so they are keyed by (service, loop).
+_async_clients: Dict[Tuple[str, int], httpx.AsyncClient] = {}
+_async_counts: Dict[str, Dict[str, int]] = {}
+
+
+def timeout_for(service: str) -> Tuple[float, float]:
+    """(connect, read) timeout tuple for a service."""
+    return (CONNECT_TIMEOUT, READ_TIMEOUTS.get(service, 30.0))
+
+
+def get_session(service: str) -> requests.Session:
+    """Return the shared pooled Session for a service, creating it on first use."""
+    sess = _sessions.get(service)
+    if sess is not None:
+        return sess
+    with _lock:
+        sess = _sessions.get(service)
+        if sess is None:
+            sess = requests.Session()
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=POOL_MAXSIZE, pool_block=POOL_BLOCK)
+            sess.mount("http://", adapter)
+            sess.mount("https://", adapter)
+            _sessions[service] = sess
+            _request_counts[service] = 0
+    return sess
+
+
+def set_session(service: str, sess: requests.Session) -> None:
+    """Use a custom Session for a service (e.g. web_fetch's locked-down one); counted like the others."""
+    with _lock:
+        _sessions[service] = sess
+        _request_counts.setdefault(service, 0)
+
+
+def request(service: str, method: str, url: str, **kwargs: Any) -> requests.Response:
+    kwargs.setdefault("timeout", timeout_for(service))
+    sess = get_session(service)
+    with _lock:
+        _request_counts[service] += 1
+    return sess.request(method, url, **kwargs)
+
+
+def get(service: str, url: str, **kwargs: Any) -> requests.Response:
+    return request(service, "GET", url, **kwargs)
+
+
+def post(service: str, url: str, **kwargs: Any) -> requests.Response:
+    return request(service, "POST", url, **kwargs)
+
+
+def get_async_client(service: str) -> httpx.AsyncClient:
+    """Return the pooled AsyncClient for a service on the running event loop."""
+    key = (service, id(asyncio.get_running_loop()))
+    client = _async_clients.get(key)
+    if client is None or client.is_closed:
+        connect, read = timeout_for(service)
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read, connect=connect),
+            limits=httpx.Limits(max_connections=ASYNC_MAX_CONNECTIONS, max_keepalive_connections=POOL_MAXSIZE),
+        )
+        _async_clients[key] = client
+        _async_counts.setdefault(service, {"requests": 0, "connections_opened": 0})
+    return client
+
+
+async def arequest(service: str, method: str, url: str, **kwargs: Any) -> httpx.Response:
+    counts = _async_counts.setdefault(service, {"requests": 0, "connections_opened": 0})
+
+    async def trace(event_name: str, info: dict) -> None:
+        # Fires only when the pool has to open a new connection (i.e. pay a handshake).
+        if event_name == "connection.connect_tcp.complete":
+            counts["connections_opened"] += 1
+
+    counts["requests"] += 1
+    client = get_async_client(service)
+    return await client.request(method, url, extensions={"trace": trace}, **kwargs)
+
+
+async def apost(service: str, url: str, **kwargs: Any) -> httpx.Response:
+    return await arequest(service, "POST", url, **kwargs)
+
+
+async def aget(service: str, url: str, **kwargs: Any) -> httpx.Response:
+    return await arequest(service, "GET", url, **kwargs)
+
+
+async def aclose_all() -> None:
+    """Close the async clients owned by the running loop (call on app shutdown)."""
+    loop_id = id(asyncio.get_running_loop())
+    for key in [k for k in _async_clients if k[1] == loop_id]:
+        await _async_clients.pop(key).aclose()
+
+
+def http_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Per-service connection stats. `connections_opened` counts TCP (and TLS) handshakes;
+    `connections_reused` is how many requests were served on an already-open connection.
+    Async (httpx) traffic is reported under "<service>_async".
+    """
+    out: Dict[str, Dict[str, int]] = {}
+    for service, sess in list(_sessions.items()):
+        opened = 0
+        served = 0
+        for adapter in set(sess.adapters.values()):
+            for key in list(adapter.poolmanager.pools.keys()):
+                pool = adapter.poolmanager.pools.get(key)
+                if pool is None:
+                    continue
+                opened += pool.num_connections
+                served += pool.num_requests
+        out[service] = {
+            "requests": _request_counts.get(service, 0),
+            "connections_opened": opened,
+            "connections_reused": max(0, served - opened),
+        }
+    for service, counts in list(_async_counts.items()):
+        out[f"{service}_async"] = {
+            **counts,
+            "connections_reused": max(0, counts["requests"] - counts["connections_opened"]),
+        }
+    return out
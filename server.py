@@ -1,14 +1,80 @@
+import json
+from contextlib import asynccontextmanager
+from typing import Optional
+
 from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-from agent_loop import run_prompt
+import http_clients
+from compaction import compaction_stats
+from gazetteer import gazetteer_stats
+from geocode_cache import geocode_stats
+from memory import DEFAULT_SESSION
+from renderers import render_stats
+from response_cache import cache_stats
+from agent_loop import (
+    arun_prompt,
+    context_stats,
+    get_fact_worker,
+    ollama_stats,
+    run_prompt_stream,
+    start_home_weather_refresh,
+    validation_stats,
+)
+from tools import forecast_stats, search_stats
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Start the extraction worker up front so jobs queued before a restart are applied.
+    worker = get_fact_worker()
+    refresher = start_home_weather_refresh()
+    yield
+    if refresher is not None:
+        refresher.stop()
+    worker.stop()
+    await http_clients.aclose_all()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 class ChatIn(BaseModel):
     text: str
+    # Conversation/client to file this turn under (e.g. one per satellite); history is per session.
+    session_id: str = DEFAULT_SESSION
+    user_id: Optional[str] = None
 
 @app.post("/chat")
-def chat(body: ChatIn):
-    resp = run_prompt(body.text)
-    return resp.model_dump()
\ No newline at end of file
+async def chat(body: ChatIn):
+    # Runs on the event loop: no threadpool worker is held while waiting on Ollama/tools.
+    resp = await arun_prompt(body.text, body.session_id, body.user_id)
+    return resp.model_dump()
+
+@app.post("/chat/stream")
+def chat_stream(body: ChatIn):
+    """Newline-delimited JSON events (see run_prompt_stream); the "done" event carries the validated response."""
+    def events():
+        try:
+            for event in run_prompt_stream(body.text, body.session_id, body.user_id):
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+        except Exception as e:
+            yield json.dumps({"event": "error", "error": str(e)}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.get("/stats")
+def stats():
+    return {
+        "http": http_clients.http_stats(),
+        "validation": validation_stats(),
+        "ollama": ollama_stats(),
+        "fast_path": render_stats(),
+        "cache": cache_stats(),
+        "context": context_stats(),
+        "compaction": compaction_stats(),
+        "geocode": geocode_stats(),
+        "gazetteer": gazetteer_stats(),
+        "forecast": forecast_stats(),
+        "search": search_stats(),
+    }
@@ -0,0 +1,133 @@
+from __future__ import annotations
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+# Fast token estimate for prompt budgeting. Qwen/Llama tokenizers average roughly 4 characters
+# per token on English text and JSON; close enough to keep prompts inside a budget without
+# loading a tokenizer on the request path.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def estimate_json_tokens(value: Any) -> int:
+    return estimate_tokens(json.dumps(value, ensure_ascii=False, separators=(",", ":")))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, marker: str = "…") -> str:
+    """Cut text to about max_tokens, preferring a word boundary."""
+    max_chars = max(0, max_tokens * CHARS_PER_TOKEN)
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    space = cut.rfind(" ")
+    if space > max_chars // 2:
+        cut = cut[:space]
+    return cut.rstrip() + marker
+
+
+# Context packing: choose what goes into the prompt by estimated tokens instead of by count.
+MESSAGE_MAX_TOKENS = int(os.getenv("CONTEXT_MESSAGE_MAX_TOKENS", "300"))
+FACTS_BUDGET_SHARE = float(os.getenv("CONTEXT_FACTS_BUDGET_SHARE", "0.35"))
+SUMMARY_BUDGET_SHARE = 0.25
+MESSAGE_OVERHEAD_TOKENS = 4  # role + chat-template framing per message
+
+
+def _message_cost(entry: Dict[str, Any]) -> int:
+    return estimate_json_tokens({k: v for k, v in entry.items() if k != "role"}) + MESSAGE_OVERHEAD_TOKENS
+
+
+MIN_PARTIAL_MESSAGE_TOKENS = 32  # smallest cut-down message worth including at the budget edge
+
+
+def _fit_message(entry: Dict[str, Any], max_tokens: int = MESSAGE_MAX_TOKENS) -> Tuple[Dict[str, Any], bool]:
+    content = entry.get("content") or ""
+    short = truncate_to_tokens(content, max_tokens)
+    if short == content:
+        return entry, False
+    return {**entry, "content": short}, True
+
+
+def pack_context(
+    budget_tokens: int,
+    facts: List[Dict[str, Any]],
+    recent: List[Dict[str, Any]],
+    relevant: Optional[List[Dict[str, Any]]] = None,
+    summary: Optional[str] = None,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Fit memory into budget_tokens (estimated). Priority:
+        1. the archived-history summary (truncated to a quarter of the budget),
+        2. facts by confidence, then most recently updated, up to FACTS_BUDGET_SHARE,
+        3. recent messages, newest first (each cut to MESSAGE_MAX_TOKENS); the first one that
+           does not fit is cut to the remaining budget and packing stops there, so the window
+           stays contiguous,
+        4. recalled older messages with whatever is left.
+    facts: [{"key", "value", "confidence", "updated_at"}]; messages are prompt entries
+    ({"role", "content", ...}) in chronological order.
+    Returns (packed, report): packed has "facts", "recent_messages", "relevant_messages" and
+    "summary"; report has the budget, tokens used and included/dropped/truncated counts.
+    """
+    used = 0
+    packed: Dict[str, Any] = {"facts": {}, "recent_messages": [], "relevant_messages": [], "summary": None}
+    report: Dict[str, Any] = {"budget": budget_tokens}
+
+    if summary:
+        packed["summary"] = truncate_to_tokens(summary, int(budget_tokens * SUMMARY_BUDGET_SHARE))
+        used += estimate_tokens(packed["summary"])
+
+    facts_cap = int(budget_tokens * FACTS_BUDGET_SHARE)
+    facts_used = 0
+    dropped_facts = 0
+    ranked = sorted(facts, key=lambda f: f.get("updated_at") or "", reverse=True)
+    ranked.sort(key=lambda f: float(f.get("confidence") if f.get("confidence") is not None else 1.0), reverse=True)
+    for f in ranked:
+        cost = estimate_json_tokens({f["key"]: f["value"]})
+        if facts_used + cost > facts_cap:
+            dropped_facts += 1
+            continue
+        packed["facts"][f["key"]] = f["value"]
+        facts_used += cost
+    used += facts_used
+    report["facts"] = {"included": len(packed["facts"]), "dropped": dropped_facts, "tokens": facts_used}
+
+    for name, entries in (("recent_messages", recent), ("relevant_messages", relevant or [])):
+        chosen: List[Dict[str, Any]] = []
+        truncated = 0
+        tokens = 0
+        for entry in reversed(entries):
+            fitted, was_cut = _fit_message(entry)
+            cost = _message_cost(fitted)
+            if used + cost > budget_tokens:
+                # Cut the message that crosses the edge down to what is left, then stop.
+                left = budget_tokens - used - (cost - estimate_tokens(fitted.get("content") or ""))
+                if left < MIN_PARTIAL_MESSAGE_TOKENS:
+                    break
+                fitted, was_cut = _fit_message(entry, left)
+                cost = _message_cost(fitted)
+                if used + cost > budget_tokens:
+                    break
+                chosen.append(fitted)
+                used += cost
+                tokens += cost
+                truncated += was_cut
+                break
+            chosen.append(fitted)
+            used += cost
+            tokens += cost
+            truncated += was_cut
+        packed[name] = list(reversed(chosen))
+        report[name] = {
+            "included": len(chosen),
+            "dropped": len(entries) - len(chosen),
+            "truncated": truncated,
+            "tokens": tokens,
+        }
+
+    report["used"] = used
+    return packed, report
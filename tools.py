@@ -1,10 +1,23 @@
 from __future__ import annotations
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
-from typing import Any, Callable, Dict, Literal, Optional
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 from pydantic import BaseModel, Field
+import logging
 import os
-import requests
+import re
+import threading
+import time
+import http_clients
+from caching import SingleFlight, TTLCache
+import gazetteer
+import web_fetch
+from geocode_cache import GEOCODE_CACHE, geocode_key
+
+logger = logging.getLogger(__name__)
 
 #tool contract
 class ToolCall(BaseModel):
@@ -23,6 +36,8 @@ def get_time(args: Dict[str, Any]) -> ToolResult:
     """
     Args
         - tz: Optional IANA timezone string (e.g. "America/New_York", "Europe/Berlin", Asia/Tokyo).
+        - location: Optional place ("Plantation, FL"); its timezone is resolved in-process by the
+          offline gazetteer (geocoding API as fallback), so the LLM never has to map it.
         - If tz is omitted, use the machine's local timezone (ONLY CORRECT if THURSDAY runs on a user's machine).
         - If user prompts their location, then return MyLocation as the value for tz.
     Returns
@@ -33,6 +48,13 @@ def get_time(args: Dict[str, Any]) -> ToolResult:
     """
     tz_name = (args.get("timezone") or args.get("tz") or "")
     tz_name = str(tz_name).strip() or None
+    location = str(args.get("location", "") or "").strip()
+    resolved = None
+    if location and tz_name is None:
+        resolved = _geocode(*_parse_location(location))
+        if resolved is None or not resolved.get("timezone"):
+            return ToolResult(ok=False, tool_name="get_time", error="geocode_no_results", data={"input_location": location})
+        tz_name = resolved["timezone"]
     #print("TZ_NAME: ", tz_name)
     now_utc = datetime.now(timezone.utc)
     try:
@@ -51,16 +73,17 @@ def get_time(args: Dict[str, Any]) -> ToolResult:
         offset = now_local.utcoffset()
         offset_seconds = int(offset.total_seconds()) if offset else 0
 
-        return ToolResult(
-            ok=True,
-            tool_name="get_time",
-            data={
-                "utc_iso": now_utc.isoformat().replace("+00:00", "Z"),
-                "local_iso": now_local.isoformat(),
-                "tz": used_tz,
-                "offset_seconds": offset_seconds,
-            },
-        )
+        data = {
+            "utc_iso": now_utc.isoformat().replace("+00:00", "Z"),
+            "local_iso": now_local.isoformat(),
+            "tz": used_tz,
+            "offset_seconds": offset_seconds,
+        }
+        if resolved is not None:
+            data["resolved_location"] = ", ".join(
+                [x for x in [resolved.get("name"), resolved.get("admin1"), resolved.get("country")] if x]
+            )
+        return ToolResult(ok=True, tool_name="get_time", data=data)
     except ZoneInfoNotFoundError:
         return ToolResult(
            ok=False,
@@ -69,22 +92,7 @@ def get_time(args: Dict[str, Any]) -> ToolResult:
             data={"tz": tz_name or ""},  
         )
 
-def weather_score_candidate(r: dict, expected_admin1: str, maybe_state_or_country: str, maybe_state: str, city: str) -> int:
-    score = 0
-    if maybe_state:
-        if r.get("country_code") == "US":
-            score += 50
-        if expected_admin1 and r.get("admin1") == expected_admin1:
-            score += 80 
-    if maybe_state_or_country and not maybe_state:
-        if str(r.get("country", "")).lower() == maybe_state_or_country.lower():
-                score += 80
-    if str(r.get("name","")).lower() == city.lower():
-        score += 5
-    return score
-    
-def get_weather(args: Dict[str, Any]) -> ToolResult:
-    US_STATES = {
+US_STATES: Dict[str, str] = {
     "AL": "Alabama",
     "AK": "Alaska",
     "AZ": "Arizona",
@@ -135,12 +143,211 @@ def get_weather(args: Dict[str, Any]) -> ToolResult:
     "WV": "West Virginia",
     "WI": "Wisconsin",
     "WY": "Wyoming",
-    }
+}
+# Reverse map for full state names ("florida" -> "FL"), built once instead of scanned per call.
+US_STATE_ABBR: Dict[str, str] = {full.lower(): abbr for abbr, full in US_STATES.items()}
+
+
+def weather_score_candidate(r: dict, expected_admin1: str, maybe_state_or_country: str, maybe_state: str, city: str) -> int:
+    score = 0
+    if maybe_state:
+        if r.get("country_code") == "US":
+            score += 50
+        if expected_admin1 and r.get("admin1") == expected_admin1:
+            score += 80 
+    if maybe_state_or_country and not maybe_state:
+        if str(r.get("country", "")).lower() == maybe_state_or_country.lower():
+                score += 80
+    if str(r.get("name","")).lower() == city.lower():
+        score += 5
+    return score
+    
+_GEOCODE_FLIGHTS = SingleFlight()
+
+
+def _parse_location(location: str) -> Tuple[str, str, str]:
+    """"Miami, Florida" -> (city, state-or-country text, 2-letter US state code or "")."""
+    parts = [p.strip() for p in location.split(",")]
+    city = parts[0]
+    maybe_state_or_country = parts[1] if len(parts) > 1 else ""
+    maybe_state = ""
+    # Accept either 2-letter state codes ("OH") or full state names ("Ohio") after the comma.
+    if maybe_state_or_country:
+        token = maybe_state_or_country
+        if len(token) == 2 and token.isalpha():
+            maybe_state = token.upper()
+        else:
+            # Map full state name -> abbreviation
+            maybe_state = US_STATE_ABBR.get(token.lower(), "")
+    return city, maybe_state_or_country, maybe_state
+
+
+def _geocode(city: str, maybe_state_or_country: str, maybe_state: str) -> Optional[Dict[str, Any]]:
+    """
+    Best geocoding candidate for the location, or None. The offline gazetteer answers first;
+    otherwise the Open-Meteo API is asked (see weather_score_candidate) and the winner is cached
+    by normalized (city, state code or country), so repeats skip the API.
+    """
+    local = gazetteer.resolve(city, maybe_state_or_country, maybe_state)
+    if local is not None:
+        return local
+    key = geocode_key(city, maybe_state or maybe_state_or_country)
+    cached = GEOCODE_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    def lookup() -> Optional[Dict[str, Any]]:
+        expected_admin1 = US_STATES.get(maybe_state, "")
+        GEOCODE_URL = os.getenv("OPEN_METEO_GEOCODE_URL", "https://geocoding-api.open-meteo.com/v1/search")
+        #LOCATION is being resolved by City, State and not just City when searching the USA
+        resp = http_clients.get(
+            "open_meteo",
+            GEOCODE_URL,
+            params={
+                # Prefer the full user-provided location for geocoding so state/country hints influence ranking.
+                "name": city,
+                "count": 10,
+                "language": "en",
+                "format": "json",
+            },
+        )
+        resp.raise_for_status() 
+        geo = resp.json()
+
+        results = geo.get("results") or []
+        if maybe_state:
+            # Open-Meteo `admin1` is typically the full state name (e.g., "Florida"), not the 2-letter code.
+            candidates = [
+                r for r in results
+                if (r.get("country_code") == "US") or (r.get("admin1") == expected_admin1)
+            ]
+            if candidates:
+                results = candidates
+        if not results:
+            return None
+        #Gotta figure out results so that for US states, it is linked to state abbreviations!
+        best = max(
+            results,
+            key=lambda r: weather_score_candidate(r, expected_admin1, maybe_state_or_country, maybe_state, city),
+        )
+        print("BEST: ", best)
+        GEOCODE_CACHE.set(key, best)
+        return best
+
+    # Concurrent misses for the same place share one geocoding call.
+    return _GEOCODE_FLIGHTS.do(key, lookup)
+
+
+# Forecasts are cached per (lat/lon rounded to ~1 km, units, days). Open-Meteo refreshes its
+# current conditions every 15 minutes, so entries expire at the next update boundary (plus a
+# short publish lag) instead of after a fixed age. Concurrent identical requests share one fetch.
+FORECAST_UPDATE_SECONDS = float(os.getenv("FORECAST_UPDATE_SECONDS", "900"))
+FORECAST_PUBLISH_LAG_SECONDS = float(os.getenv("FORECAST_PUBLISH_LAG_SECONDS", "60"))
+FORECAST_CACHE: TTLCache[Dict[str, Any]] = TTLCache(maxsize=int(os.getenv("FORECAST_CACHE_MAXSIZE", "256")))
+_FORECAST_FLIGHTS = SingleFlight()
+
+
+def _forecast_ttl() -> float:
+    """Seconds until the next forecast update is published (update boundary + publish lag)."""
+    # Measured from now - LAG: a fetch made after a boundary but before the new run is published
+    # still got the old forecast, so it must expire at this boundary's publish time, not the next.
+    return FORECAST_UPDATE_SECONDS - ((time.time() - FORECAST_PUBLISH_LAG_SECONDS) % FORECAST_UPDATE_SECONDS)
+
+
+def _get_forecast(lat: float, lon: float, units: str, days: int, refresh: bool = False) -> Dict[str, Any]:
+    """Open-Meteo forecast JSON, served from FORECAST_CACHE unless refresh=True."""
+    key = (round(float(lat), 2), round(float(lon), 2), units, days)
+    if not refresh:
+        hit = FORECAST_CACHE.get(key)
+        if hit is not None:
+            return hit
+
+    def fetch() -> Dict[str, Any]:
+        FORECAST_URL = os.getenv("OPEN_METEO_FORECAST_URL", "https://api.open-meteo.com/v1/forecast")
+        resp = http_clients.get(
+            "open_meteo",
+            FORECAST_URL,
+            params={
+            "latitude": key[0],
+            "longitude": key[1],
+            "current_weather": "true",
+            "daily": "temperature_2m_max,temperature_2m_min,precipitation_sum",
+            "timezone": "auto",
+            "forecast_days": days,
+            # Units
+            "temperature_unit": "fahrenheit" if units == "imperial" else "celsius",
+            "wind_speed_unit": "mph" if units == "imperial" else "kmh",
+            "precipitation_unit": "inch" if units == "imperial" else "mm",
+            },
+        )
+        resp.raise_for_status()
+        wx = resp.json()
+        FORECAST_CACHE.set(key, wx, ttl=_forecast_ttl())
+        return wx
+
+    return _FORECAST_FLIGHTS.do(("refresh",) + key if refresh else key, fetch)
+
+
+def forecast_stats() -> Dict[str, Any]:
+    return {**FORECAST_CACHE.stats(), "single_flight": _FORECAST_FLIGHTS.stats()}
+
+
+class HomeWeatherRefresher:
+    """
+    Keeps the forecast cache warm for the household's home location: right after each
+    forecast update it re-fetches the home forecast for `days` (today, tomorrow), so "what's
+    the weather?" never waits on Open-Meteo. get_location() is re-read every cycle (None = skip).
+    """
+
+    def __init__(
+        self,
+        get_location: Callable[[], Optional[str]],
+        units: str = "imperial",
+        days: Tuple[int, ...] = (1, 2),
+    ) -> None:
+        self.get_location = get_location
+        self.units = units
+        self.days = days
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="home-weather-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def refresh_once(self) -> bool:
+        location = self.get_location()
+        if not location:
+            return False
+        best = _geocode(*_parse_location(location))
+        if best is None:
+            return False
+        for days in self.days:
+            _get_forecast(best["latitude"], best["longitude"], self.units, days, refresh=True)
+        return True
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.refresh_once()
+            except Exception:
+                logger.exception("Home weather refresh failed")
+            self._stop.wait(_forecast_ttl())
+
+def get_weather(args: Dict[str, Any]) -> ToolResult:
     """
     Args
         - location: str (required)
         - units: Literal["imperial","metric"] = "imperial"
-        - days: int
+        - days: int = 1 (today; SYSTEM_PROMPT asks for 2 only for "tomorrow")
     """ 
     location = str(args.get("location", "") or "").strip()
     units = str(args.get("units", "imperial")).lower().strip()
@@ -148,94 +355,26 @@ def get_weather(args: Dict[str, Any]) -> ToolResult:
         return ToolResult(ok=False, tool_name="get_weather", error="missing_location")
     if units not in ("imperial", "metric"):
         units = "imperial"
-    parts = [p.strip() for p in location.split(",")]
-    city = parts[0]
-    maybe_state_or_country = parts[1] if len(parts) > 1 else ""
-    maybe_state_or_country = maybe_state_or_country.strip()
-    days_raw = args.get("days", 2)
+    days_raw = args.get("days", 1)
     try:
         days = int(days_raw)
     except (TypeError, ValueError):
-        days = 2
+        days = 1
     # Clamp forecast length to a safe range
     days = max(1, min(days, 7))
 
-    maybe_state = ""
-    # Accept either 2-letter state codes ("OH") or full state names ("Ohio") after the comma.
-    if maybe_state_or_country:
-        token = maybe_state_or_country.strip()
-        if len(token) == 2 and token.isalpha():
-            maybe_state = token.upper()
-        else:
-            # Try to map full state name -> abbreviation
-            token_norm = token.lower()
-            for abbr, full in US_STATES.items():
-                if full.lower() == token_norm:
-                    maybe_state = abbr
-                    break
-
-    expected_admin1 = US_STATES.get(maybe_state, "")
-    GEOCODE_URL = os.getenv("OPEN_METEO_GEOCODE_URL", "https://geocoding-api.open-meteo.com/v1/search")
-    #LOCATION is being resolved by City, State and not just City when searching the USA
-    resp = requests.get(
-        GEOCODE_URL,
-        params={
-            # Prefer the full user-provided location for geocoding so state/country hints influence ranking.
-            "name": city,
-            "count": 10,
-            "language": "en",
-            "format": "json",
-        },
-        timeout=10,
-    )
-    resp.raise_for_status() 
-    geo = resp.json()
-
-    results = geo.get("results") or []
-    if maybe_state:
-        # Open-Meteo `admin1` is typically the full state name (e.g., "Florida"), not the 2-letter code.
-        candidates = [
-            r for r in results
-            if (r.get("country_code") == "US") or (r.get("admin1") == expected_admin1)
-        ]
-        if candidates:
-            results = candidates
-    if not results:
+    best = _geocode(*_parse_location(location))
+    if best is None:
         return ToolResult(
         ok=False,
         tool_name="get_weather",
         error="geocode_no_results",
         data={"input_location": location}
         )
-    #Gotta figure out results so that for US states, it is linked to state abbreviations!
-    best = max(
-        results,
-        key=lambda r: weather_score_candidate(r, expected_admin1, maybe_state_or_country, maybe_state, city),
-    )
     lat = best["latitude"]
     lon = best["longitude"]
 
-    print("BEST: ", best)
-
-    FORECAST_URL = os.getenv("OPEN_METEO_FORECAST_URL", "https://api.open-meteo.com/v1/forecast")
-    resp = requests.get(
-        FORECAST_URL,
-        params={
-        "latitude": lat,
-        "longitude": lon,
-        "current_weather": "true",
-        "daily": "temperature_2m_max,temperature_2m_min,precipitation_sum",
-        "timezone": "auto",
-        "forecast_days": days,
-        # Units
-        "temperature_unit": "fahrenheit" if units == "imperial" else "celsius",
-        "wind_speed_unit": "mph" if units == "imperial" else "kmh",
-        "precipitation_unit": "inch" if units == "imperial" else "mm",
-        },
-        timeout=10
-    )
-    resp.raise_for_status()
-    wx = resp.json()
+    wx = _get_forecast(lat, lon, units, days)
     current = wx.get("current_weather") or {}
     daily = wx.get("daily") or {}
 
@@ -248,6 +387,7 @@ def get_weather(args: Dict[str, Any]) -> ToolResult:
     "longitude": lon,
     "timezone": wx.get("timezone"),
     "units": units,
+    "forecast_days": days,
     "current": current,
     "today": {
         "date": (daily.get("time") or [None])[0],
@@ -257,62 +397,180 @@ def get_weather(args: Dict[str, Any]) -> ToolResult:
     }
 })
 
+# Search results are cached per normalized query. Queries asking for fresh information ("news",
+# "today", "latest", ...) expire quickly; everything else is stable enough to keep for a while.
+# Concurrent identical queries share one SearXNG call.
+SEARCH_CACHE_TTL = float(os.getenv("WEB_SEARCH_CACHE_TTL_SECONDS", "1800"))
+SEARCH_FRESH_TTL = float(os.getenv("WEB_SEARCH_FRESH_TTL_SECONDS", "120"))
+SEARCH_MAX_RESULTS = int(os.getenv("WEB_SEARCH_MAX_RESULTS", "5"))
+WEB_SEARCH_DEEP_DEFAULT = os.getenv("WEB_SEARCH_DEEP", "0") == "1"  # deep mode when the call doesn't say
+SEARCH_CACHE: TTLCache[ToolResult] = TTLCache(maxsize=int(os.getenv("WEB_SEARCH_CACHE_MAXSIZE", "512")))
+_SEARCH_FLIGHTS = SingleFlight()
+_FRESH_QUERY = re.compile(
+    r"\b(?:news|today|tonight|latest|breaking|live|now|current(?:ly)?|yesterday|this (?:week|morning|evening)"
+    r"|scores?|prices?|stocks?|weather)\b"
+)
+# Query parameters that only track the click, never change the page.
+_TRACKING_PARAMS = re.compile(r"^(?:utm_\w+|fbclid|gclid|mc_cid|mc_eid|ref|ref_src|igshid|spm)$")
+_search_lock = threading.Lock()
+_search_duplicates = 0
+_search_fresh = 0
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop edge punctuation: "  Latest  NEWS? " -> "latest news"."""
+    return " ".join(query.lower().split()).strip(" ?!.,;:")
+
+
+def canonical_url(url: str) -> str:
+    """Scheme-, www-, fragment- and tracking-insensitive form of `url`, for deduplication."""
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    params = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not _TRACKING_PARAMS.match(k)
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(("", host, path, urlencode(params), ""))
+
+
+def _dedupe_results(raw_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Collapse results that point at the same page (same URL from several engines), keeping rank order."""
+    global _search_duplicates
+    by_url: Dict[str, Dict[str, Any]] = {}
+    for r in raw_results:
+        url = r.get("url", "")
+        if not url:
+            continue
+        result = {
+            "title": r.get("title", ""),
+            "url": url,
+            "snippet": r.get("content", ""),
+            "engine": r.get("engine", ""),
+            "published_date": r.get("publishedDate") or r.get("published_date"),
+        }
+        key = canonical_url(url)
+        kept = by_url.get(key)
+        if kept is None:
+            by_url[key] = result
+            continue
+        with _search_lock:
+            _search_duplicates += 1
+        # Same page: keep the higher-ranked entry but take the fuller snippet/title/date.
+        for field in ("title", "snippet"):
+            if len(result[field] or "") > len(kept[field] or ""):
+                kept[field] = result[field]
+        kept["published_date"] = kept["published_date"] or result["published_date"]
+    return list(by_url.values())
+
+
+def _search_ttl(query_norm: str) -> float:
+    global _search_fresh
+    if _FRESH_QUERY.search(query_norm):
+        with _search_lock:
+            _search_fresh += 1
+        return SEARCH_FRESH_TTL
+    return SEARCH_CACHE_TTL
+
+
+def _search(query: str, query_norm: str) -> ToolResult:
+    hit = SEARCH_CACHE.get(query_norm)
+    if hit is not None:
+        return hit
+
+    def fetch() -> ToolResult:
+        BASE_URL = os.getenv("SEARXNG_BASE_URL", "http://localhost:55000")
+        SEARCH_URL = f"{BASE_URL}/search"
+
+        params = {
+            "q": query_norm,
+            "format": "json",
+            "language": "en",
+            "safesearch": "0",
+            "pageno": 1,
+        }
+        resp = http_clients.get("searxng", SEARCH_URL, params=params)
+        resp.raise_for_status()
+
+        try:
+            data = resp.json()
+        except ValueError:
+            return ToolResult(
+                ok=False,
+                tool_name="web_search",
+                error="invalid_json_response",
+                data={"response_preview": resp.text[:500]},
+            )
+
+        results = _dedupe_results(data.get("results", []))[:SEARCH_MAX_RESULTS]
+        result = ToolResult(
+            ok=True,
+            tool_name="web_search",
+            data={
+                "query": query,
+                "result_count": len(results),
+                "results": results,
+            },
+        )
+        if results:
+            SEARCH_CACHE.set(query_norm, result, ttl=_search_ttl(query_norm))
+        return result
+
+    return _SEARCH_FLIGHTS.do(query_norm, fetch)
+
+
+def _deep_search(query: str, query_norm: str, shallow: ToolResult) -> ToolResult:
+    key = ("deep", query_norm)
+    hit = SEARCH_CACHE.get(key)
+    if hit is not None:
+        return hit
+
+    def fetch() -> ToolResult:
+        deep = web_fetch.deep_excerpts(query, shallow.data.get("results") or [])
+        logger.debug("web_search deep: %s", {k: v for k, v in deep.items() if k != "excerpts"})
+        result = ToolResult(ok=True, tool_name="web_search", data={**shallow.data, **deep})
+        if deep["excerpts"]:
+            SEARCH_CACHE.set(key, result, ttl=_search_ttl(query_norm))
+        return result
+
+    return _SEARCH_FLIGHTS.do(key, fetch)
+
+
 def web_search(args: Dict[str, Any]) -> ToolResult:
     """
     Args
         - query: the query that the user provides to search on the web for. 
+        - deep: optional bool; also fetch the top pages and return query-ranked text excerpts
+          (web_fetch.py, bounded by WEB_DEEP_DEADLINE_SECONDS).
     Returns
-        - results: list of results provided by SearXNG
+        - results: top SearXNG results, one per page (duplicate URLs merged)
+        - excerpts (deep only): [{url, text, score}], best first
     """
     query = str(args.get("query") or "").strip()
     if not query:
         return ToolResult(ok=False, tool_name="web_search", error="missing_query")
+    query_norm = normalize_query(query) or query
+    shallow = _search(query, query_norm)
+    deep = args.get("deep", WEB_SEARCH_DEEP_DEFAULT)
+    if isinstance(deep, str):
+        deep = deep.strip().lower() in ("1", "true", "yes")
+    if not deep or not shallow.ok or not shallow.data.get("results"):
+        return shallow
+    return _deep_search(query, query_norm, shallow)
 
-    BASE_URL = os.getenv("SEARXNG_BASE_URL", "http://localhost:55000")
-    SEARCH_URL = f"{BASE_URL}/search"
 
-    params = {
-        "q": query,
-        "format": "json",
-        "language": "en",
-        "safesearch": "0",
-        "pageno": 1,
+def search_stats() -> Dict[str, Any]:
+    with _search_lock:
+        duplicates, fresh = _search_duplicates, _search_fresh
+    return {
+        **SEARCH_CACHE.stats(),
+        "single_flight": _SEARCH_FLIGHTS.stats(),
+        "duplicates_merged": duplicates,
+        "fresh_queries": fresh,
     }
-    resp = requests.get(SEARCH_URL, params=params, timeout=20)
-    resp.raise_for_status()
-
-    try:
-        data = resp.json()
-    except ValueError:
-        return ToolResult(
-            ok=False,
-            tool_name="web_search",
-            error="invalid_json_response",
-            data={"response_preview": resp.text[:500]},
-        )
-
-    raw_results = data.get("results", [])[:5]
-    results = []
-    for r in raw_results:
-        results.append(
-            {
-                "title": r.get("title", ""),
-                "url": r.get("url", ""),
-                "snippet": r.get("content", ""),
-                "engine": r.get("engine", ""),
-                "published_date": r.get("publishedDate") or r.get("published_date"),
-            }
-        )
-
-    return ToolResult(
-        ok=True,
-        tool_name="web_search",
-        data={
-            "query": query,
-            "result_count": len(results),
-            "results": results,
-        },
-    )
 
 #Tool Result to echo text
 def echo(args: Dict[str, Any]) -> ToolResult:
@@ -336,3 +594,96 @@ def execute_tool(call: ToolCall) -> ToolResult:
     except Exception as e:
         return ToolResult(ok=False, tool_name=call.name, error=f"tool_exception: {e}")
     
+
+
+# Per-tool deadlines (seconds) and the overall budget for all tool calls in one turn.
+# get_time is a clock read unless it gets a location the gazetteer and GEOCODE_CACHE don't know;
+# then it geocodes over the network like get_weather, so it gets the same budget.
+TOOL_TIMEOUTS: Dict[str, float] = {
+    "get_time": float(os.getenv("TOOL_TIMEOUT_GET_TIME", "12")),
+    "echo": float(os.getenv("TOOL_TIMEOUT_ECHO", "2")),
+    "get_weather": float(os.getenv("TOOL_TIMEOUT_GET_WEATHER", "12")),
+    "web_search": float(os.getenv("TOOL_TIMEOUT_WEB_SEARCH", "15")),
+}
+DEFAULT_TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT_DEFAULT", "10"))
+TOOL_TURN_DEADLINE = float(os.getenv("TOOL_TURN_DEADLINE", "20"))
+
+# Bounded pool shared by every request; tools are I/O bound so a handful of threads is plenty.
+_TOOL_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("TOOL_MAX_WORKERS", "8")),
+    thread_name_prefix="thursday-tool",
+)
+
+
+def execute_tools(calls: List[ToolCall], turn_deadline: Optional[float] = None) -> List[ToolResult]:
+    """
+    Run independent tool calls concurrently. Results keep the order of `calls`.
+    Each call gets its own deadline (TOOL_TIMEOUTS), counted from when it starts running so time
+    queued behind other requests' tools is not charged to it, and capped by the overall turn
+    deadline; a call that misses it returns ToolResult(ok=False, error="timeout") instead of
+    stalling the turn.
+    """
+    if not calls:
+        return []
+    turn_end = time.monotonic() + (TOOL_TURN_DEADLINE if turn_deadline is None else turn_deadline)
+    starts: List[float] = [0.0] * len(calls)
+    started = [threading.Event() for _ in calls]
+
+    def run(i: int, call: ToolCall) -> ToolResult:
+        starts[i] = time.monotonic()
+        started[i].set()
+        return execute_tool(call)
+
+    futures = [_TOOL_EXECUTOR.submit(run, i, call) for i, call in enumerate(calls)]
+
+    results: List[ToolResult] = []
+    for i, (call, fut) in enumerate(zip(calls, futures)):
+        try:
+            if not started[i].wait(timeout=max(0.0, turn_end - time.monotonic())):
+                raise FuturesTimeout()
+            deadline = min(starts[i] + TOOL_TIMEOUTS.get(call.name, DEFAULT_TOOL_TIMEOUT), turn_end)
+            results.append(fut.result(timeout=max(0.0, deadline - time.monotonic())))
+        except FuturesTimeout:
+            # The worker thread is left to finish on its own; its HTTP timeout bounds it.
+            fut.cancel()
+            results.append(ToolResult(ok=False, tool_name=call.name, error="timeout"))
+    return results
+
+
+# The async pipeline keeps hundreds of conversations in flight, so its blocking tool calls get
+# a pool sized for that (threads waiting on sockets are cheap) instead of sharing the small one.
+_ASYNC_TOOL_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("TOOL_ASYNC_MAX_WORKERS", "256")),
+    thread_name_prefix="thursday-atool",
+)
+
+
+async def aexecute_tools(calls: List[ToolCall], turn_deadline: Optional[float] = None) -> List[ToolResult]:
+    """
+    Async counterpart of execute_tools for the event-loop pipeline. Tools run on their own pool
+    (never on the event loop or Starlette's threadpool); results keep the order of `calls`.
+    A tool's deadline (TOOL_TIMEOUTS) starts when it starts running, so time queued behind other
+    conversations' tools is not charged to it; the turn deadline still bounds the whole call.
+    """
+    if not calls:
+        return []
+    loop = asyncio.get_running_loop()
+    turn_end = loop.time() + (TOOL_TURN_DEADLINE if turn_deadline is None else turn_deadline)
+
+    async def run_one(call: ToolCall) -> ToolResult:
+        started: asyncio.Future = loop.create_future()
+
+        def run() -> ToolResult:
+            loop.call_soon_threadsafe(lambda: started.done() or started.set_result(loop.time()))
+            return execute_tool(call)
+
+        fut = loop.run_in_executor(_ASYNC_TOOL_EXECUTOR, run)
+        try:
+            start = await asyncio.wait_for(asyncio.shield(started), timeout=max(0.0, turn_end - loop.time()))
+            deadline = min(start + TOOL_TIMEOUTS.get(call.name, DEFAULT_TOOL_TIMEOUT), turn_end)
+            return await asyncio.wait_for(fut, timeout=max(0.0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            fut.cancel()
+            return ToolResult(ok=False, tool_name=call.name, error="timeout")
+
+    return list(await asyncio.gather(*(run_one(c) for c in calls)))
@@ -0,0 +1,299 @@
+from __future__ import annotations
+import logging
+import threading
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from memory import MemoryDB
+
+logger = logging.getLogger(__name__)
+
+# Embedding index over facts and messages, stored next to them in the brain DB as float32 blobs
+# (L2-normalized, so cosine similarity is a dot product). Vectors are loaded into one NumPy
+# matrix per kind and searched with a brute-force top-k, which stays in the low milliseconds
+# up to ~100k rows (see bench_vector.py).
+#
+# Each embeddings table bumps its own version row in `meta` by trigger, so a search only
+# reloads vectors after they changed. Message vectors are append-only, so new rows are appended
+# to the loaded matrix; a full reload happens only after deletes (retention).
+
+EMBED_BATCH_SIZE = 64
+
+_SCHEMA = """
+            CREATE TABLE IF NOT EXISTS fact_embeddings (
+                key TEXT PRIMARY KEY,
+                updated_at TEXT NOT NULL,
+                vec BLOB NOT NULL
+                );
+            CREATE TABLE IF NOT EXISTS message_embeddings (
+                message_id INTEGER PRIMARY KEY,
+                vec BLOB NOT NULL
+                );
+            INSERT OR IGNORE INTO meta(key, value) VALUES ('fact_vectors_version', 0);
+            INSERT OR IGNORE INTO meta(key, value) VALUES ('message_vectors_epoch', 0);
+            CREATE TRIGGER IF NOT EXISTS trg_fact_vectors_insert AFTER INSERT ON fact_embeddings
+            BEGIN
+                UPDATE meta SET value = value + 1 WHERE key = 'fact_vectors_version';
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_fact_vectors_update AFTER UPDATE ON fact_embeddings
+            BEGIN
+                UPDATE meta SET value = value + 1 WHERE key = 'fact_vectors_version';
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_fact_vectors_delete AFTER DELETE ON fact_embeddings
+            BEGIN
+                UPDATE meta SET value = value + 1 WHERE key = 'fact_vectors_version';
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_message_vectors_delete AFTER DELETE ON message_embeddings
+            BEGIN
+                UPDATE meta SET value = value + 1 WHERE key = 'message_vectors_epoch';
+            END;
+            -- Vectors follow their source rows.
+            CREATE TRIGGER IF NOT EXISTS trg_facts_embedding_delete AFTER DELETE ON facts
+            BEGIN
+                DELETE FROM fact_embeddings WHERE key = old.key;
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_messages_embedding_delete AFTER DELETE ON messages
+            BEGIN
+                DELETE FROM message_embeddings WHERE message_id = old.id;
+            END;
+            """
+
+
+def to_blob(vec: np.ndarray) -> bytes:
+    return np.asarray(vec, dtype=np.float32).tobytes()
+
+
+def from_blobs(blobs: Sequence[bytes]) -> np.ndarray:
+    if not blobs:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.frombuffer(b"".join(blobs), dtype=np.float32).reshape(len(blobs), -1)
+
+
+def normalize(vecs: np.ndarray) -> np.ndarray:
+    vecs = np.asarray(vecs, dtype=np.float32)
+    norms = np.linalg.norm(vecs, axis=-1, keepdims=True)
+    return vecs / np.maximum(norms, 1e-12)
+
+
+def fact_text(key: str, value_json: str) -> str:
+    return f"{key.replace('_', ' ')}: {value_json}"
+
+
+def top_k(matrix: np.ndarray, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+    """(row, score) of the k rows with the highest dot product with `query`, best first."""
+    if k <= 0 or not len(matrix):
+        return []
+    scores = matrix @ query
+    if k < len(scores):
+        rows = np.argpartition(-scores, k - 1)[:k]
+    else:
+        rows = np.arange(len(scores))
+    rows = rows[np.argsort(-scores[rows])]
+    return [(int(r), float(scores[r])) for r in rows]
+
+
+class _Matrix:
+    """Growable (ids, vectors) pair; capacity grows geometrically so appends are amortized O(1)."""
+
+    def __init__(self) -> None:
+        self.ids = np.zeros(0, dtype=np.int64)
+        self._vecs: Optional[np.ndarray] = None
+        self.size = 0
+
+    @property
+    def vecs(self) -> np.ndarray:
+        if self._vecs is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self._vecs[: self.size]
+
+    def append(self, ids: Sequence[int], vecs: np.ndarray) -> None:
+        if not len(ids):
+            return
+        need = self.size + len(ids)
+        if self._vecs is None or need > len(self._vecs):
+            cap = need + max(need // 2, 1024)
+            grown = np.empty((cap, vecs.shape[1]), dtype=np.float32)
+            grown_ids = np.empty(cap, dtype=np.int64)
+            if self._vecs is not None:
+                grown[: self.size] = self._vecs[: self.size]
+                grown_ids[: self.size] = self.ids[: self.size]
+            self._vecs, self.ids = grown, grown_ids
+        self._vecs[self.size:need] = vecs
+        self.ids[self.size:need] = ids
+        self.size = need
+
+
+class VectorIndex:
+    """
+    Semantic index over MemoryDB facts and messages.
+        - sync() embeds only what is new: facts whose updated_at moved and messages past the
+          last indexed id. The background thread (start()/notify()) calls it after writes.
+        - search_facts(query, k) / search_messages(query, k, before_id) return best-first hits.
+    embed(texts) -> one vector per text (any float dtype; normalized here).
+    """
+
+    def __init__(self, db: MemoryDB, embed: Callable[[List[str]], Sequence[Sequence[float]]]) -> None:
+        self.db = db
+        self.embed = embed
+        with self.db._connect() as conn:
+            conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._facts: Optional[Tuple[int, List[str], np.ndarray]] = None
+        self._messages = _Matrix()
+        self._messages_epoch: Optional[int] = None
+        self._last_query: Optional[Tuple[str, np.ndarray]] = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        out = []
+        for i in range(0, len(texts), EMBED_BATCH_SIZE):
+            out.append(normalize(np.asarray(self.embed(texts[i:i + EMBED_BATCH_SIZE]), dtype=np.float32)))
+        return np.concatenate(out) if out else np.zeros((0, 0), dtype=np.float32)
+
+    # --- indexing ---
+
+    def index_facts(self) -> int:
+        with self.db._connect() as conn:
+            rows = conn.execute("""
+                SELECT f.key, f.value_json, f.updated_at
+                FROM facts f LEFT JOIN fact_embeddings e ON e.key = f.key
+                WHERE e.key IS NULL OR e.updated_at IS NOT f.updated_at
+            """).fetchall()
+        if not rows:
+            return 0
+        vecs = self._embed([fact_text(r["key"], r["value_json"]) for r in rows])
+        with self.db._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO fact_embeddings(key, updated_at, vec) VALUES (?,?,?)",
+                [(r["key"], r["updated_at"], to_blob(v)) for r, v in zip(rows, vecs)],
+            )
+        return len(rows)
+
+    def index_messages(self, limit: int = 512) -> int:
+        with self.db._connect() as conn:
+            last = conn.execute("SELECT COALESCE(MAX(message_id), 0) FROM message_embeddings").fetchone()[0]
+            rows = conn.execute("""
+                SELECT id, content FROM messages
+                WHERE id > ? AND content NOT LIKE 'TOOL_RESULT:%'
+                ORDER BY id
+                LIMIT ?
+            """, (last, limit)).fetchall()
+        if not rows:
+            return 0
+        vecs = self._embed([r["content"] for r in rows])
+        with self.db._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO message_embeddings(message_id, vec) VALUES (?,?)",
+                [(r["id"], to_blob(v)) for r, v in zip(rows, vecs)],
+            )
+        return len(rows)
+
+    def unindexed_fact_keys(self) -> List[str]:
+        """Facts with no up-to-date vector yet (new or changed since the last sync)."""
+        with self.db._connect() as conn:
+            rows = conn.execute("""
+                SELECT f.key FROM facts f LEFT JOIN fact_embeddings e ON e.key = f.key
+                WHERE e.key IS NULL OR e.updated_at IS NOT f.updated_at
+            """).fetchall()
+        return [r["key"] for r in rows]
+
+    def sync(self) -> int:
+        """Embed everything not yet indexed. Returns the number of rows embedded."""
+        total = self.index_facts()
+        while True:
+            n = self.index_messages()
+            total += n
+            if not n:
+                return total
+
+    # --- loading ---
+
+    def _meta(self, conn, key: str) -> int:
+        return conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()["value"]
+
+    def _fact_matrix(self) -> Tuple[List[str], np.ndarray]:
+        conn = self.db._connect()
+        version = self._meta(conn, "fact_vectors_version")
+        with self._lock:
+            if self._facts is None or self._facts[0] != version:
+                rows = conn.execute("SELECT key, vec FROM fact_embeddings ORDER BY key").fetchall()
+                self._facts = (version, [r["key"] for r in rows], from_blobs([r["vec"] for r in rows]))
+            return self._facts[1], self._facts[2]
+
+    def _message_matrix(self) -> _Matrix:
+        conn = self.db._connect()
+        epoch = self._meta(conn, "message_vectors_epoch")
+        with self._lock:
+            if self._messages_epoch != epoch:
+                # Rows were deleted since the last load: start over.
+                self._messages = _Matrix()
+                self._messages_epoch = epoch
+            last = int(self._messages.ids[self._messages.size - 1]) if self._messages.size else 0
+            rows = conn.execute(
+                "SELECT message_id, vec FROM message_embeddings WHERE message_id > ? ORDER BY message_id",
+                (last,),
+            ).fetchall()
+            self._messages.append([r["message_id"] for r in rows], from_blobs([r["vec"] for r in rows]))
+            return self._messages
+
+    # --- search ---
+
+    def _query_vec(self, query: str) -> np.ndarray:
+        # Facts and messages are searched with the same prompt; embed it once.
+        with self._lock:
+            last = self._last_query
+        if last is not None and last[0] == query:
+            return last[1]
+        vec = self._embed([query])[0]
+        with self._lock:
+            self._last_query = (query, vec)
+        return vec
+
+    def search_facts(self, query: str, k: int = 8) -> List[Tuple[str, float]]:
+        keys, matrix = self._fact_matrix()
+        if not keys:
+            return []
+        return [(keys[row], score) for row, score in top_k(matrix, self._query_vec(query), k)]
+
+    def search_messages(self, query: str, k: int = 5, before_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        m = self._message_matrix()
+        end = m.size if before_id is None else int(np.searchsorted(m.ids[: m.size], before_id))
+        if not end:
+            return []
+        hits = top_k(m.vecs[:end], self._query_vec(query), k)
+        return [(int(m.ids[row]), score) for row, score in hits]
+
+    # --- background indexing ---
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="vector-indexer", daemon=True)
+        self._thread.start()
+        self._wake.set()
+
+    def notify(self) -> None:
+        """Something was written; embed it in the background."""
+        self._wake.set()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.sync()
+            except Exception:
+                # Unindexed rows are picked up by the next sync.
+                logger.exception("Vector index sync failed")
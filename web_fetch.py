@@ -0,0 +1,313 @@
+from __future__ import annotations
+import codecs
+import ipaddress
+import os
+import re
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from http.cookiejar import DefaultCookiePolicy
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional, Set
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError
+
+import http_clients
+
+# Deep mode for web_search: fetch the top result pages concurrently, stream-parse them into
+# plain-text paragraphs and keep the passages that overlap most with the query.
+# Latency is bounded three ways: a small dedicated pool, a per-page byte cap and one deadline for
+# the whole stage. Whatever has been parsed by the deadline is used, including the first
+# paragraphs of pages still downloading; stragglers stop at their next read (their read timeout
+# never exceeds the time left) and their late output is ignored.
+
+DEEP_PAGES = int(os.getenv("WEB_DEEP_PAGES", "3"))
+DEEP_DEADLINE_SECONDS = float(os.getenv("WEB_DEEP_DEADLINE_SECONDS", "4"))
+DEEP_MAX_BYTES = int(os.getenv("WEB_DEEP_MAX_BYTES", str(512 * 1024)))
+DEEP_MAX_EXCERPTS = int(os.getenv("WEB_DEEP_MAX_EXCERPTS", "4"))
+EXCERPTS_PER_PAGE = 2
+EXCERPT_MAX_CHARS = 600
+MAX_REDIRECTS = 3
+# Pages come from search results, i.e. the open web; never let them point at the LAN.
+ALLOW_PRIVATE_HOSTS = os.getenv("WEB_FETCH_ALLOW_PRIVATE", "0") == "1"
+USER_AGENT = os.getenv("WEB_FETCH_USER_AGENT", "Mozilla/5.0 (compatible; THURSDAY/1.0)")
+
+_FETCH_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("WEB_FETCH_WORKERS", "4")), thread_name_prefix="web-fetch"
+)
+
+_TEXT_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+_SKIP_TAGS = {
+    "head", "script", "style", "noscript", "template", "svg", "nav", "header", "footer", "aside", "form", "iframe",
+}
+_BLOCK_TAGS = {
+    "p", "div", "li", "ul", "ol", "br", "tr", "td", "th", "table", "section", "article", "main",
+    "blockquote", "pre", "h1", "h2", "h3", "h4", "h5", "h6", "dd", "dt", "figcaption",
+}
+_WORD = re.compile(r"\w+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "in", "is", "it", "of",
+    "on", "or", "that", "the", "this", "to", "was", "what", "when", "where", "which", "who", "why",
+    "with", "does", "do", "did", "can", "latest", "news", "today",
+}
+
+
+class _TextExtractor(HTMLParser):
+    """Incremental HTML -> paragraphs; chrome (scripts, nav, footers, forms) is dropped."""
+
+    def __init__(self, paragraphs: Optional[List[str]] = None) -> None:
+        super().__init__(convert_charrefs=True)
+        self.paragraphs: List[str] = [] if paragraphs is None else paragraphs
+        self._buf: List[str] = []
+        self._skip_depth = 0
+
+    def _flush(self) -> None:
+        text = " ".join("".join(self._buf).split())
+        self._buf = []
+        if text:
+            self.paragraphs.append(text)
+
+    def handle_starttag(self, tag: str, attrs) -> None:
+        if tag in _SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in _BLOCK_TAGS:
+            self._flush()
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in _SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in _BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data: str) -> None:
+        if not self._skip_depth:
+            self._buf.append(data)
+
+    def close(self) -> None:
+        super().close()
+        self._flush()
+
+
+def _is_public_address(addr: str) -> bool:
+    return ipaddress.ip_address(addr.split("%")[0]).is_global
+
+
+def _check_peer(sock: socket.socket) -> socket.socket:
+    # Checked on the connected socket, not a separate DNS lookup, so a rebinding answer that
+    # differs between check and connect cannot reach the LAN. Nothing has been sent yet.
+    if not ALLOW_PRIVATE_HOSTS and not _is_public_address(sock.getpeername()[0]):
+        sock.close()
+        raise OSError("refusing to fetch from a non-public address")
+    return sock
+
+
+class _PublicHTTPConnection(HTTPConnection):
+    def _new_conn(self) -> socket.socket:
+        sock = super()._new_conn()
+        try:
+            return _check_peer(sock)
+        except OSError as e:
+            raise NewConnectionError(self, str(e)) from e
+
+
+class _PublicHTTPSConnection(HTTPSConnection):
+    def _new_conn(self) -> socket.socket:
+        sock = super()._new_conn()
+        try:
+            return _check_peer(sock)
+        except OSError as e:
+            raise NewConnectionError(self, str(e)) from e
+
+
+class _PublicHTTPPool(HTTPConnectionPool):
+    ConnectionCls = _PublicHTTPConnection
+
+
+class _PublicHTTPSPool(HTTPSConnectionPool):
+    ConnectionCls = _PublicHTTPSConnection
+
+
+class _PublicOnlyAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _PublicHTTPPool, "https": _PublicHTTPSPool}
+
+
+def _page_session() -> requests.Session:
+    """
+    Session for fetching arbitrary pages: connections to non-public addresses are refused, cookies
+    are never stored (so one user's search can't leave state for the next) and proxy env vars are
+    ignored (the peer check would otherwise only see the proxy).
+    """
+    sess = requests.Session()
+    sess.trust_env = False
+    sess.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    adapter = _PublicOnlyAdapter(pool_connections=8, pool_maxsize=http_clients.POOL_MAXSIZE)
+    sess.mount("http://", adapter)
+    sess.mount("https://", adapter)
+    return sess
+
+
+http_clients.set_session("web", _page_session())
+
+
+def _allowed(url: str) -> bool:
+    parts = urlsplit(url)
+    return parts.scheme in ("http", "https") and bool(parts.hostname)
+
+
+def fetch_text(
+    url: str, deadline: float, max_bytes: int = DEEP_MAX_BYTES, paragraphs: Optional[List[str]] = None
+) -> List[str]:
+    """
+    Paragraphs of the page at `url`, parsed while it downloads. Stops at max_bytes or the
+    (time.monotonic()) deadline and returns what was parsed so far. Non-text pages give [];
+    hosts that resolve to non-public addresses raise requests.ConnectionError.
+    Paragraphs are appended to `paragraphs` as they complete, so a caller that stops waiting
+    can still read the partial page.
+    """
+    for _ in range(MAX_REDIRECTS + 1):
+        if not _allowed(url):
+            return []
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return []
+        resp = http_clients.get(
+            "web",
+            url,
+            stream=True,
+            allow_redirects=False,
+            headers={"User-Agent": USER_AGENT, "Accept": "text/html,text/plain;q=0.9"},
+            timeout=(min(http_clients.CONNECT_TIMEOUT, remaining), remaining),
+        )
+        if resp.is_redirect and resp.headers.get("Location"):
+            # Followed by hand so every hop is checked and bounded by the deadline.
+            url = urljoin(url, resp.headers["Location"])
+            resp.close()
+            continue
+        break
+    else:
+        return []
+
+    with resp:
+        if resp.status_code != 200:
+            return []
+        ctype = resp.headers.get("Content-Type", "text/html").split(";")[0].strip().lower()
+        if ctype not in _TEXT_TYPES:
+            return []
+        # Without a charset requests assumes ISO-8859-1 for text/*; the web is mostly UTF-8.
+        encoding = resp.encoding if "charset=" in resp.headers.get("Content-Type", "").lower() else "utf-8"
+        try:
+            decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        except LookupError:
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        parser = _TextExtractor(paragraphs)
+        received = 0
+        for chunk in resp.iter_content(chunk_size=16 * 1024):
+            chunk = chunk[: max_bytes - received]
+            received += len(chunk)
+            if ctype == "text/plain":
+                parser.handle_data(decoder.decode(chunk))
+            else:
+                parser.feed(decoder.decode(chunk))
+            if received >= max_bytes or time.monotonic() >= deadline:
+                break
+        parser.close()
+        return parser.paragraphs
+
+
+def query_terms(query: str) -> Set[str]:
+    return {w for w in _WORD.findall(query.lower()) if w not in _STOPWORDS and len(w) > 1}
+
+
+def _passages(paragraphs: List[str]) -> List[str]:
+    """Paragraphs split at sentence boundaries into pieces of at most EXCERPT_MAX_CHARS."""
+    out = []
+    for para in paragraphs:
+        if len(para) <= EXCERPT_MAX_CHARS:
+            out.append(para)
+            continue
+        piece = ""
+        for sentence in _SENTENCE_END.split(para):
+            if piece and len(piece) + len(sentence) + 1 > EXCERPT_MAX_CHARS:
+                out.append(piece[:EXCERPT_MAX_CHARS])
+                piece = ""
+            piece = f"{piece} {sentence}".strip()
+        if piece:
+            out.append(piece[:EXCERPT_MAX_CHARS])
+    return out
+
+
+def rank_excerpts(query: str, pages: List[Dict[str, Any]], k: int = DEEP_MAX_EXCERPTS) -> List[Dict[str, Any]]:
+    """
+    Best passages across pages by overlap with the query: the share of distinct query terms a
+    passage contains, plus a small bonus for repeated hits. At most EXCERPTS_PER_PAGE per page;
+    ties go to the higher-ranked search result.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return []
+    scored = []
+    for rank, page in enumerate(pages):
+        for pos, text in enumerate(_passages(page["paragraphs"])):
+            words = _WORD.findall(text.lower())
+            hits = [w for w in words if w in terms]
+            if not hits:
+                continue
+            score = len(set(hits)) / len(terms) + min(len(hits), 10) * 0.01
+            scored.append((-score, rank, pos, page["url"], text))
+    scored.sort()
+    per_page: Dict[str, int] = {}
+    out = []
+    for neg_score, _, _, url, text in scored:
+        if per_page.get(url, 0) >= EXCERPTS_PER_PAGE:
+            continue
+        per_page[url] = per_page.get(url, 0) + 1
+        out.append({"url": url, "text": text, "score": round(-neg_score, 3)})
+        if len(out) >= k:
+            break
+    return out
+
+
+def deep_excerpts(
+    query: str,
+    results: List[Dict[str, Any]],
+    pages: int = DEEP_PAGES,
+    deadline_seconds: float = DEEP_DEADLINE_SECONDS,
+    max_bytes: int = DEEP_MAX_BYTES,
+) -> Dict[str, Any]:
+    """Fetch the top `pages` results concurrently and rank their passages. Never exceeds the deadline."""
+    start = time.monotonic()
+    deadline = start + deadline_seconds
+    urls = [r["url"] for r in results if r.get("url")][:pages]
+    partial: Dict[str, List[str]] = {url: [] for url in urls}
+    futures = {
+        _FETCH_EXECUTOR.submit(fetch_text, url, deadline, max_bytes, partial[url]): url for url in urls
+    }
+    _, not_done = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+    for fut in not_done:
+        fut.cancel()
+
+    fetched = []
+    failed = 0
+    for url in futures.values():
+        # Unfinished or failed (e.g. read timeout mid-page) fetches still count for what they parsed.
+        paragraphs = list(partial[url])
+        if paragraphs:
+            fetched.append({"url": url, "paragraphs": paragraphs})
+        else:
+            failed += 1
+    # Keep search-rank order for tie-breaking.
+    fetched.sort(key=lambda p: urls.index(p["url"]))
+    return {
+        "excerpts": rank_excerpts(query, fetched),
+        "pages_fetched": len(fetched),
+        "pages_failed": failed,
+        "fetch_ms": round((time.monotonic() - start) * 1000, 1),
+    }